@@ -1,8 +1,70 @@
 import sys
 import os
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+
+from ui_loader import load_ui
+from number_analysis import (
+    AnalysisCancelled, ENGINES, ENGINE_PYTHON, ENGINE_NUMPY, NUMPY_AVAILABLE,
+    PARALLEL_THRESHOLD, FollowState, analyze_numbers, analyze_numbers_cached,
+    analyze_numbers_parallel, format_histogram,
+)
+
+
+# Период проверки отслеживаемого файла (в миллисекундах)
+FOLLOW_INTERVAL_MS = 1000
+
+
+class AnalysisWorker(QThread):
+    """Фоновый анализ файла, чтобы не блокировать интерфейс"""
+
+    progressChanged = pyqtSignal(int, int)
+    analysisFinished = pyqtSignal(object)
+    analysisFailed = pyqtSignal(str)
+    analysisCancelled = pyqtSignal()
+
+    def __init__(self, file_path, engine=ENGINE_PYTHON, follow_state=None, use_sidecar=False,
+                 parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.engine = engine
+        self.follow_state = follow_state
+        self.use_sidecar = use_sidecar
+        self.file_replaced = False
+        self._cancel_requested = False
+
+    def cancel(self):
+        """Запрос отмены (обрабатывается после текущего блока)"""
+        self._cancel_requested = True
+
+    def report_progress(self, bytes_read, count):
+        if self._cancel_requested:
+            raise AnalysisCancelled()
+        self.progressChanged.emit(bytes_read, count)
+
+    def run(self):
+        try:
+            if self.follow_state is not None:
+                # Режим слежения: разбираются только дописанные байты
+                self.file_replaced = self.follow_state.poll(progress=self.report_progress)
+                stats = self.follow_state.current_stats()
+            else:
+                parallel = os.path.getsize(self.file_path) >= PARALLEL_THRESHOLD
+                if self.use_sidecar:
+                    stats = analyze_numbers_cached(self.file_path, progress=self.report_progress,
+                                                   engine=self.engine, parallel=parallel)
+                else:
+                    analyze = analyze_numbers_parallel if parallel else analyze_numbers
+                    stats = analyze(self.file_path, progress=self.report_progress, engine=self.engine)
+        except AnalysisCancelled:
+            self.analysisCancelled.emit()
+        except UnicodeDecodeError:
+            self.analysisFailed.emit("Ошибка кодировки файла. Попробуйте файл в кодировке UTF-8")
+        except Exception as e:
+            self.analysisFailed.emit(f"Ошибка при анализе файла: {str(e)}")
+        else:
+            self.analysisFinished.emit(stats)
 
 
 class NumberAnalyzer(QtWidgets.QMainWindow):
@@ -10,17 +72,39 @@ class NumberAnalyzer(QtWidgets.QMainWindow):
         super().__init__()
 
         # Загрузка интерфейса из файла
-        uic.loadUi('designer.ui', self)
+        load_ui('designer.ui', self)
 
         # Подключение кнопок к функциям
         self.loadButton.clicked.connect(self.load_file)
         self.saveButton.clicked.connect(self.save_results)
+        self.cancelButton.clicked.connect(self.cancel_analysis)
+        self.followCheckBox.toggled.connect(self.toggle_follow)
+
+        # Разбор через NumPy доступен, только если библиотека установлена
+        if not NUMPY_AVAILABLE:
+            self.engineComboBox.model().item(ENGINES.index(ENGINE_NUMPY)).setEnabled(False)
 
         # Переменные для хранения результатов
         self.min_value = None
         self.max_value = None
         self.avg_value = None
-        self.numbers = []
+        self.median_value = None
+        self.p90_value = None
+        self.p99_value = None
+        self.std_value = None
+        self.histogram = []
+        self.count = 0
+
+        # Фоновый анализ
+        self.worker = None
+        self.file_path = None
+        self.file_size = 0
+
+        # Слежение за дописываемым файлом
+        self.follow_state = None
+        self.follow_timer = QTimer(self)
+        self.follow_timer.setInterval(FOLLOW_INTERVAL_MS)
+        self.follow_timer.timeout.connect(self.check_file_growth)
 
         # Обновление интерфейса
         self.update_display()
@@ -46,49 +130,146 @@ class NumberAnalyzer(QtWidgets.QMainWindow):
             self.show_error(f"Ошибка при загрузке файла: {str(e)}")
 
     def analyze_file(self, file_path):
-        """Анализ чисел в файле"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-
-            # Разделение содержимого на числа (используем пробельные символы как разделители)
-            number_strings = content.split()
-            numbers = []
-
-            # Преобразование строк в числа с обработкой ошибок
-            for num_str in number_strings:
-                try:
-                    number = int(num_str)
-                    numbers.append(number)
-                except ValueError:
-                    # Пропускаем нечисловые значения
-                    continue
-
-            if not numbers:
+        """Запуск анализа чисел в файле в фоновом потоке"""
+        if self.worker is not None:
+            return  # Предыдущий анализ еще не завершен
+
+        self.file_path = file_path
+        if self.followCheckBox.isChecked():
+            # Первый разбор тоже идет через FollowState, чтобы запомнить смещение
+            self.follow_state = FollowState(file_path, self.selected_engine())
+            self.follow_timer.start()
+
+        self.start_worker()
+
+    def start_worker(self):
+        """Запуск фонового потока для текущего файла"""
+        self.file_size = os.path.getsize(self.file_path)
+
+        self.worker = AnalysisWorker(self.file_path, self.selected_engine(), self.follow_state,
+                                     self.sidecarCheckBox.isChecked(), self)
+        self.worker.progressChanged.connect(self.show_progress)
+        self.worker.analysisFinished.connect(self.analysis_finished)
+        self.worker.analysisFailed.connect(self.analysis_failed)
+        self.worker.analysisCancelled.connect(self.analysis_cancelled)
+        self.worker.finished.connect(self.worker_stopped)
+
+        self.set_busy(True)
+        self.statusTextEdit.setText(f"Анализ файла '{os.path.basename(self.file_path)}'...")
+        self.worker.start()
+
+    def toggle_follow(self, checked):
+        """Включение и выключение слежения за файлом"""
+        if not checked:
+            self.follow_timer.stop()
+            self.follow_state = None
+        elif self.file_path is not None:
+            self.follow_state = FollowState(self.file_path, self.selected_engine())
+            self.follow_timer.start()
+            self.check_file_growth()
+
+    def check_file_growth(self):
+        """Разбор новых данных, если отслеживаемый файл изменился"""
+        if self.worker is None and self.follow_state is not None and self.follow_state.has_changes():
+            self.start_worker()
+
+    def selected_engine(self):
+        """Способ разбора, выбранный пользователем"""
+        return ENGINES[self.engineComboBox.currentIndex()]
+
+    def cancel_analysis(self):
+        """Отмена текущего анализа (и слежения за файлом)"""
+        self.followCheckBox.setChecked(False)
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancelButton.setEnabled(False)
+
+    def show_progress(self, bytes_read, count):
+        """Вывод прогресса анализа"""
+        if self.file_size:
+            percent = bytes_read * 100 // self.file_size
+        else:
+            percent = 100
+        self.statusTextEdit.setText(
+            f"Анализ файла '{os.path.basename(self.file_path)}': {percent}%\n"
+            f"Обработано байт: {bytes_read} из {self.file_size}\n"
+            f"Найдено чисел: {count}"
+        )
+
+    def analysis_finished(self, stats):
+        """Обработка результатов анализа"""
+        file_name = os.path.basename(self.file_path)
+        following = self.worker.follow_state is not None
+
+        if not stats.count:
+            if following:
+                # Файл может быть еще пустым: ждем, пока в него допишут числа
+                self.statusTextEdit.setText(
+                    f"Файл '{file_name}' отслеживается\n"
+                    f"Корректных целых чисел пока нет"
+                )
+            else:
                 self.show_error("В файле не найдено корректных целых чисел")
-                return
+            return
+
+        # Расчет статистики
+        try:
+            avg_value = stats.avg_value
+        except OverflowError as e:
+            self.show_error(f"Ошибка при анализе файла: {str(e)}")
+            return
 
-            # Расчет статистики
-            self.numbers = numbers
-            self.min_value = min(numbers)
-            self.max_value = max(numbers)
-            self.avg_value = sum(numbers) / len(numbers)
+        self.count = stats.count
+        self.min_value = stats.min_value
+        self.max_value = stats.max_value
+        self.avg_value = avg_value
+        self.median_value = stats.median_value
+        self.p90_value = stats.p90_value
+        self.p99_value = stats.p99_value
+        self.std_value = stats.std_value
+        self.histogram = stats.histogram()
 
-            # Обновление интерфейса
-            self.update_display()
+        # Обновление интерфейса
+        self.update_display()
 
-            # Вывод информации о файле
-            file_name = os.path.basename(file_path)
+        # Вывод информации о файле
+        if following:
+            state = self.worker.follow_state
+            replaced = "Файл был перезаписан и прочитан заново\n" if self.worker.file_replaced else ""
+            self.statusTextEdit.setText(
+                f"Файл '{file_name}' отслеживается\n"
+                f"{replaced}"
+                f"Найдено чисел: {stats.count}\n"
+                f"Прочитано байт: {state.offset + len(state.tail)}"
+            )
+        else:
             self.statusTextEdit.setText(
                 f"Файл '{file_name}' успешно загружен\n"
-                f"Найдено чисел: {len(numbers)}\n"
+                f"Найдено чисел: {stats.count}\n"
                 f"Нечисловые значения были проигнорированы"
             )
 
-        except UnicodeDecodeError:
-            self.show_error("Ошибка кодировки файла. Попробуйте файл в кодировке UTF-8")
-        except Exception as e:
-            self.show_error(f"Ошибка при анализе файла: {str(e)}")
+    def analysis_failed(self, message):
+        """Обработка ошибки анализа"""
+        self.followCheckBox.setChecked(False)
+        self.show_error(message)
+
+    def analysis_cancelled(self):
+        """Обработка отмены анализа"""
+        self.statusTextEdit.setText("Анализ файла отменен")
+
+    def worker_stopped(self):
+        """Освобождение фонового потока"""
+        self.worker.deleteLater()
+        self.worker = None
+        self.set_busy(False)
+
+    def set_busy(self, busy):
+        """Блокировка кнопок на время анализа"""
+        self.loadButton.setEnabled(not busy)
+        self.saveButton.setEnabled(not busy)
+        self.engineComboBox.setEnabled(not busy)
+        self.cancelButton.setEnabled(busy)
 
     def save_results(self):
         """Сохранение результатов в файл"""
@@ -115,7 +296,13 @@ class NumberAnalyzer(QtWidgets.QMainWindow):
                 file.write(f"Минимальное значение: {self.min_value}\n")
                 file.write(f"Максимальное значение: {self.max_value}\n")
                 file.write(f"Среднее значение: {self.avg_value:.2f}\n")
-                file.write(f"Количество чисел: {len(self.numbers)}\n")
+                file.write(f"Количество чисел: {self.count}\n")
+                file.write(f"Медиана: {self.median_value:.2f}\n")
+                file.write(f"90-й процентиль: {self.p90_value:.2f}\n")
+                file.write(f"99-й процентиль: {self.p99_value:.2f}\n")
+                file.write(f"Стандартное отклонение: {self.std_value:.2f}\n")
+                file.write("Гистограмма (оценка по t-digest):\n")
+                file.write(format_histogram(self.histogram) + "\n")
                 file.write("=" * 30 + "\n")
 
             # Вывод сообщения об успешном сохранении
@@ -130,16 +317,34 @@ class NumberAnalyzer(QtWidgets.QMainWindow):
             self.minValueLabel.setText(str(self.min_value))
             self.maxValueLabel.setText(str(self.max_value))
             self.avgValueLabel.setText(f"{self.avg_value:.2f}")
+            self.medianValueLabel.setText(f"{self.median_value:.2f}")
+            self.p90ValueLabel.setText(f"{self.p90_value:.2f}")
+            self.p99ValueLabel.setText(f"{self.p99_value:.2f}")
+            self.stdValueLabel.setText(f"{self.std_value:.2f}")
+            self.histogramLabel.setText(format_histogram(self.histogram))
         else:
             self.minValueLabel.setText("Не рассчитано")
             self.maxValueLabel.setText("Не рассчитано")
             self.avgValueLabel.setText("Не рассчитано")
+            self.medianValueLabel.setText("Не рассчитано")
+            self.p90ValueLabel.setText("Не рассчитано")
+            self.p99ValueLabel.setText("Не рассчитано")
+            self.stdValueLabel.setText("Не рассчитано")
+            self.histogramLabel.setText("Не рассчитано")
 
     def show_error(self, message):
         """Показать сообщение об ошибке"""
         QMessageBox.critical(self, "Ошибка", message)
         self.statusTextEdit.setText(f"Ошибка: {message}")
 
+    def closeEvent(self, event):
+        """Обработчик закрытия окна"""
+        self.follow_timer.stop()
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+        event.accept()
+
 
 def main():
     app = QtWidgets.QApplication(sys.argv)
@@ -1,9 +1,365 @@
 import sys
 import os
-from PyQt5 import QtWidgets, uic
-from PyQt5.QtWidgets import QFileDialog, QMessageBox, QApplication
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QTextCursor
+import re
+import time
+from bisect import bisect_left
+from PyQt5 import QtWidgets
+from PyQt5.QtWidgets import QFileDialog, QMessageBox, QApplication, QInputDialog, QProgressBar
+from PyQt5.QtCore import Qt, QThread, QTimer, QEventLoop, pyqtSignal
+from PyQt5.QtGui import QTextCursor, QPainter, QFontDatabase, QKeySequence
+
+from ui_loader import load_ui
+from text_buffer import (
+    DEFAULT_ENCODING, ENCODING_NAMES, LARGE_FILE_THRESHOLD, UNITS_BYTES, UNITS_CHARS,
+    IndexCancelled, MappedTextFile, RecoveryJournal, atomic_write, encode_text, find_journals,
+    iter_bytes_chunks, journal_header, journal_matches_file, read_text_file, remove_journal,
+    remove_temp, replace_with_temp, write_temp,
+)
+from text_search import (
+    NUMPY_AVAILABLE, TRIGRAM_INDEX_LIMIT, BytesSource, SearchCancelled, TextSource, TrigramIndex,
+    compile_query, search_source,
+)
+
+
+# Как часто накопленные правки дописываются в журнал восстановления (в миллисекундах)
+JOURNAL_INTERVAL_MS = 2000
+
+
+class FileTaskWorker(QThread):
+    """Чтение или запись файла в фоне; task(progress) выполняется в потоке"""
+
+    progressChanged = pyqtSignal('qint64', 'qint64')
+    taskFinished = pyqtSignal(object)
+    taskFailed = pyqtSignal(object)
+
+    def __init__(self, task, parent=None):
+        super().__init__(parent)
+        self.task = task
+        # Операция удалась (выставляет окно: обработчик результата еще может передумать)
+        self.succeeded = False
+
+    def run(self):
+        try:
+            result = self.task(self.progressChanged.emit)
+        except Exception as e:
+            self.taskFailed.emit(e)
+        else:
+            self.taskFinished.emit(result)
+
+
+class LineIndexWorker(QThread):
+    """Фоновое построение индекса строк большого файла"""
+
+    progressChanged = pyqtSignal('qint64')
+    indexFinished = pyqtSignal()
+    indexFailed = pyqtSignal(str)
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def report_progress(self, bytes_done):
+        if self._cancel_requested:
+            raise IndexCancelled()
+        self.progressChanged.emit(bytes_done)
+
+    def run(self):
+        try:
+            self.index.build(progress=self.report_progress)
+        except IndexCancelled:
+            pass
+        except Exception as e:
+            self.indexFailed.emit(f"Ошибка при индексации файла: {str(e)}")
+        else:
+            self.indexFinished.emit()
+
+
+class SearchWorker(QThread):
+    """Поиск по снимку документа в фоне; совпадения отправляются пачками"""
+
+    matchesFound = pyqtSignal(object)
+    progressChanged = pyqtSignal('qint64', 'qint64')
+    searchFinished = pyqtSignal(object)
+    searchFailed = pyqtSignal(str)
+
+    def __init__(self, source, pattern, replacement=None, regex=False, candidates=None,
+                 build_index=False, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.pattern = pattern
+        self.replacement = replacement
+        self.regex = regex
+        self.candidates = candidates
+        self.build_index = build_index
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def report_progress(self, done):
+        if self._cancel_requested:
+            raise SearchCancelled()
+        self.progressChanged.emit(done, self.source.size)
+
+    def run(self):
+        index = TrigramIndex() if self.build_index else None
+        try:
+            for batch in search_source(self.source, self.pattern, self.replacement, self.regex,
+                                       self.candidates, index, self.report_progress):
+                self.matchesFound.emit(batch)
+        except SearchCancelled:
+            return
+        except Exception as e:
+            self.searchFailed.emit(f"Ошибка при поиске: {str(e)}")
+            return
+        # Построенный по пути триграммный индекс (или None)
+        self.searchFinished.emit(index)
+
+
+class SearchState:
+    """Найденные совпадения одного запроса в одной версии документа"""
+
+    def __init__(self, key, replacing=False):
+        self.key = key
+        self.replacing = replacing
+        self.matches = []
+        self.offsets = []
+        self.complete = False
+
+    def add(self, batch):
+        self.matches.extend(batch)
+        self.offsets.extend(match[0] for match in batch)
+
+
+class LargeFileView(QtWidgets.QAbstractScrollArea):
+    """Большой файл: декодируются и рисуются только видимые строки
+
+    Правка идет через таблицу кусков документа (MappedTextFile), которая
+    появляется после построения индекса строк.
+    """
+
+    textEdited = pyqtSignal()
+    editFailed = pyqtSignal(str)
+
+    # Отступ текста от левого края
+    MARGIN = 4
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.document = None
+        self.text_width = 0
+        self.read_only = True
+        self.cursor_line = 0
+        self.cursor_column = 0
+        # Выделение найденного: ((строка, столбец), (строка, столбец))
+        self.selection = None
+        self.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.viewport().setCursor(Qt.IBeamCursor)
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+        self.horizontalScrollBar().valueChanged.connect(self.viewport().update)
+
+    def set_document(self, document):
+        """Показ файла (MappedTextFile) или очистка при None"""
+        self.document = document
+        self.text_width = 0
+        self.cursor_line = self.cursor_column = 0
+        self.selection = None
+        self.verticalScrollBar().setValue(0)
+        self.horizontalScrollBar().setValue(0)
+        self.update_scrollbars()
+
+    def set_read_only(self, read_only):
+        self.read_only = read_only
+        self.viewport().update()
+
+    def editable(self):
+        return (not self.read_only and self.document is not None
+                and self.document.table is not None)
+
+    def line_height(self):
+        return self.fontMetrics().lineSpacing()
+
+    def visible_lines(self):
+        return max(1, self.viewport().height() // self.line_height())
+
+    def first_line(self):
+        return self.verticalScrollBar().value()
+
+    def update_scrollbars(self):
+        """Пересчет диапазона прокрутки (в строках) по текущему числу строк"""
+        visible = self.visible_lines()
+        lines = self.document.line_count if self.document else 0
+        vertical = self.verticalScrollBar()
+        vertical.setRange(0, max(0, lines - visible))
+        vertical.setPageStep(visible)
+        horizontal = self.horizontalScrollBar()
+        horizontal.setRange(0, max(0, self.text_width - self.viewport().width()))
+        horizontal.setPageStep(self.viewport().width())
+        self.viewport().update()
+
+    def scroll_to_line(self, line):
+        """Переход к строке (с нуля): индекс разреженный, время не зависит от номера"""
+        self.verticalScrollBar().setValue(line)
+
+    def set_cursor(self, line, column):
+        """Перемещение курсора с прокруткой до него"""
+        line = max(0, min(line, self.document.line_count - 1))
+        self.cursor_line = line
+        self.cursor_column = max(0, min(column, len(self.document.line_text(line))))
+
+        first = self.first_line()
+        visible = self.visible_lines()
+        if line < first:
+            self.scroll_to_line(line)
+        elif line >= first + visible:
+            self.scroll_to_line(line - visible + 1)
+
+        text = self.document.line_text(line)
+        x = self.fontMetrics().horizontalAdvance(text[:self.cursor_column])
+        horizontal = self.horizontalScrollBar()
+        if x < horizontal.value():
+            horizontal.setValue(x)
+        elif x > horizontal.value() + self.viewport().width() - 2 * self.MARGIN:
+            self.text_width = max(self.text_width, x + 2 * self.MARGIN)
+            self.update_scrollbars()
+            horizontal.setValue(x - self.viewport().width() + 2 * self.MARGIN)
+        self.viewport().update()
+
+    def set_selection(self, start, end):
+        """Выделение от start до end (позиции (строка, столбец)), курсор в конце"""
+        self.selection = (start, end)
+        self.scroll_to_line(max(0, start[0] - self.visible_lines() // 2))
+        self.set_cursor(*end)
+
+    def edit(self, operation, *args):
+        """Правка документа с переносом курсора в возвращенную позицию"""
+        if not self.editable():
+            return
+        self.selection = None
+        try:
+            position = operation(*args)
+        except UnicodeEncodeError:
+            self.editFailed.emit("Символы нельзя записать в кодировке файла")
+            return
+        if position is None:
+            return
+        self.update_scrollbars()
+        self.set_cursor(*position)
+        self.textEdited.emit()
+
+    def keyPressEvent(self, event):
+        if self.document is None:
+            return super().keyPressEvent(event)
+
+        document = self.document
+        line, column = self.cursor_line, self.cursor_column
+        self.selection = None
+        key = event.key()
+        control = event.modifiers() & Qt.ControlModifier
+
+        if event.matches(QKeySequence.Undo):
+            self.edit(document.undo)
+        elif event.matches(QKeySequence.Redo):
+            self.edit(document.redo)
+        elif event.matches(QKeySequence.Paste):
+            self.edit(document.insert_text, line, column, QApplication.clipboard().text())
+        elif key == Qt.Key_Up:
+            self.set_cursor(line - 1, column)
+        elif key == Qt.Key_Down:
+            self.set_cursor(line + 1, column)
+        elif key == Qt.Key_PageUp:
+            self.set_cursor(line - self.visible_lines(), column)
+        elif key == Qt.Key_PageDown:
+            self.set_cursor(line + self.visible_lines(), column)
+        elif key == Qt.Key_Left:
+            if column > 0:
+                self.set_cursor(line, column - 1)
+            elif line > 0:
+                self.set_cursor(line - 1, len(document.line_text(line - 1)))
+        elif key == Qt.Key_Right:
+            if column < len(document.line_text(line)):
+                self.set_cursor(line, column + 1)
+            else:
+                self.set_cursor(line + 1, 0)
+        elif key == Qt.Key_Home:
+            self.set_cursor(0 if control else line, 0)
+        elif key == Qt.Key_End:
+            last = document.line_count - 1 if control else line
+            self.set_cursor(last, len(document.line_text(last)))
+        elif key == Qt.Key_Backspace:
+            self.edit(document.delete_backward, line, column)
+        elif key == Qt.Key_Delete:
+            self.edit(document.delete_forward, line, column)
+        elif key in (Qt.Key_Return, Qt.Key_Enter):
+            self.edit(document.insert_text, line, column, "\n")
+        elif event.text() and event.text().isprintable() and not control:
+            self.edit(document.insert_text, line, column, event.text())
+        else:
+            super().keyPressEvent(event)
+
+    def mousePressEvent(self, event):
+        if self.document is None:
+            return
+        self.selection = None
+        line = self.first_line() + event.pos().y() // self.line_height()
+        line = min(line, self.document.line_count - 1)
+        text = self.document.line_text(line)
+        x = event.pos().x() - self.MARGIN + self.horizontalScrollBar().value()
+
+        # Двоичный поиск столбца по ширине начала строки
+        metrics = self.fontMetrics()
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            center = metrics.horizontalAdvance(text[:middle]) - metrics.horizontalAdvance(text[middle - 1]) / 2
+            if center <= x:
+                low = middle
+            else:
+                high = middle - 1
+        self.set_cursor(line, low)
+
+    def paintEvent(self, event):
+        if self.document is None:
+            return
+        painter = QPainter(self.viewport())
+        metrics = self.fontMetrics()
+        height = self.line_height()
+        x = self.MARGIN - self.horizontalScrollBar().value()
+        y = metrics.ascent()
+        width = self.text_width
+        first = self.first_line()
+
+        lines = self.document.lines(first, self.visible_lines() + 1)
+        for number, text in enumerate(lines, first):
+            if self.selection is not None:
+                (start_line, start_column), (end_line, end_column) = self.selection
+                if start_line <= number <= end_line:
+                    left = metrics.horizontalAdvance(text[:start_column]) if number == start_line else 0
+                    right = metrics.horizontalAdvance(
+                        text[:end_column] if number == end_line else text)
+                    painter.fillRect(x + left, y - metrics.ascent(), max(right - left, 2), height,
+                                     self.palette().highlight())
+            painter.drawText(x, y, text)
+            width = max(width, metrics.horizontalAdvance(text) + 2 * self.MARGIN)
+            if number == self.cursor_line and not self.read_only:
+                cursor_x = x + metrics.horizontalAdvance(text[:self.cursor_column])
+                painter.drawLine(cursor_x, y - metrics.ascent(), cursor_x, y + metrics.descent())
+            y += height
+        painter.end()
+
+        # Ширина прокрутки растет по мере просмотра длинных строк
+        if width != self.text_width:
+            self.text_width = width
+            self.update_scrollbars()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scrollbars()
 
 
 class TextEditor(QtWidgets.QMainWindow):
@@ -11,11 +367,35 @@ class TextEditor(QtWidgets.QMainWindow):
         super().__init__()
 
         # Загрузка интерфейса из файла
-        uic.loadUi('text_editor.ui', self)
+        load_ui('text_editor.ui', self)
 
         # Текущий файл
         self.current_file = None
         self.is_modified = False
+        # Кодировка, в которой файл был открыт и будет сохранен
+        self.encoding = DEFAULT_ENCODING
+
+        # Большой файл открывается только для просмотра видимых строк
+        self.large_file = None
+        self.index_worker = None
+        # Временный файл с правками, открытый вместо файла, который не удалось заменить
+        self.temp_backing = None
+        self.largeView = LargeFileView(self)
+        self.largeView.hide()
+        self.verticalLayout.insertWidget(self.verticalLayout.indexOf(self.textEdit) + 1,
+                                         self.largeView)
+        self.largeView.textEdited.connect(self.text_modified)
+        self.largeView.editFailed.connect(self.statusbar.showMessage)
+
+        # Фоновое открытие или сохранение (одновременно только одно)
+        self.io_worker = None
+        # Что запустить после конца текущей операции (или None)
+        self.after_io = None
+        self.progressBar = QProgressBar(self)
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setMaximumWidth(200)
+        self.progressBar.hide()
+        self.statusbar.addPermanentWidget(self.progressBar)
 
         # Подключение кнопок к функциям
         self.newButton.clicked.connect(self.new_file)
@@ -27,19 +407,54 @@ class TextEditor(QtWidgets.QMainWindow):
         self.actionOpen.triggered.connect(self.open_file)
         self.actionSave.triggered.connect(self.save_file)
         self.actionExit.triggered.connect(self.close)
+        self.actionGoToLine.triggered.connect(self.go_to_line)
+        self.actionFind.triggered.connect(self.show_search_panel)
+        self.actionFindNext.triggered.connect(self.find_next)
+        self.actionReplace.triggered.connect(lambda: self.show_search_panel(replace=True))
+
+        # Поиск и замена
+        self.document_version = 0
+        self.search = None
+        self.search_cache = {}
+        self.search_worker = None
+        self.trigram_index = None
+        self.current_match = None
+        self.navigate_pending = False
+        self.findLineEdit.returnPressed.connect(self.find_next)
+        self.replaceLineEdit.returnPressed.connect(self.replace_current)
+        self.findNextButton.clicked.connect(self.find_next)
+        self.replaceButton.clicked.connect(self.replace_current)
+        self.replaceAllButton.clicked.connect(self.replace_all)
+        self.closeSearchButton.clicked.connect(self.hide_search_panel)
 
         # Подключение сигнала изменения текста
         self.textEdit.textChanged.connect(self.text_modified)
 
+        # Журнал правок для восстановления после сбоя
+        self.journal = RecoveryJournal()
+        self.journal_paused = False
+        self.pending_recovery = None
+        self.textEdit.document().contentsChange.connect(self.record_text_change)
+        self.journal_timer = QTimer(self)
+        self.journal_timer.setInterval(JOURNAL_INTERVAL_MS)
+        self.journal_timer.timeout.connect(self.journal.flush)
+        self.journal_timer.start()
+        QTimer.singleShot(0, self.check_recovery)
+
         # Обновление интерфейса
         self.update_title()
 
     def new_file(self):
         """Создание нового файла"""
         if self.check_save():
+            self.close_large_file()
+            self.journal.discard()
+            self.journal_paused = True
             self.textEdit.clear()
+            self.journal_paused = False
             self.current_file = None
             self.is_modified = False
+            self.encoding = DEFAULT_ENCODING
             self.fileNameLabel.setText("Новый файл")
             self.update_title()
             self.statusbar.showMessage("Создан новый файл")
@@ -58,51 +473,510 @@ class TextEditor(QtWidgets.QMainWindow):
                 self.load_file(file_path)
 
     def load_file(self, file_path):
-        """Загрузка файла"""
+        """Загрузка файла (чтение и декодирование идут в фоне)"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
+            if os.path.getsize(file_path) >= LARGE_FILE_THRESHOLD:
+                self.open_large_file(file_path)
+                return
+        except Exception as e:
+            self.show_error(f"Ошибка при открытии файла: {str(e)}")
+            return
+        self.load_text_file(file_path)
 
-            self.textEdit.setPlainText(content)
-            self.current_file = file_path
-            self.is_modified = False
+    def load_text_file(self, file_path, finished=None):
+        """Чтение файла целиком в QTextEdit; finished(результат) заменяет load_finished"""
+        self.start_io(
+            lambda progress: read_text_file(file_path, progress),
+            finished or (lambda result: self.load_finished(file_path, *result)),
+            self.load_failed,
+            f"Открытие файла: {file_path}",
+        )
 
-            # Обновление интерфейса
-            file_name = os.path.basename(file_path)
-            self.fileNameLabel.setText(file_name)
-            self.update_title()
+    def load_failed(self, error):
+        self.pending_recovery = None
+        self.show_error(f"Ошибка при открытии файла: {str(error)}")
+
+    def load_finished(self, file_path, content, encoding):
+        self.close_large_file()
+        self.journal.discard()
+        self.journal_paused = True
+        self.textEdit.setPlainText(content)
+        self.journal_paused = False
+        self.current_file = file_path
+        self.is_modified = False
+        self.encoding = encoding
+
+        # Обновление интерфейса
+        file_name = os.path.basename(file_path)
+        self.fileNameLabel.setText(file_name)
+        self.update_title()
+        if encoding != DEFAULT_ENCODING:
+            self.statusbar.showMessage(
+                f"Файл открыт (кодировка {ENCODING_NAMES[encoding]}): {file_path}")
+        else:
             self.statusbar.showMessage(f"Файл открыт: {file_path}")
+        self.apply_recovery(UNITS_CHARS)
 
-        except UnicodeDecodeError:
-            # Попробуем другие кодировки
-            try:
-                with open(file_path, 'r', encoding='cp1251') as file:
-                    content = file.read()
+    def open_large_file(self, file_path):
+        """Открытие большого файла для просмотра без чтения в память"""
+        document = MappedTextFile(file_path)
+        self.close_large_file()
+        self.journal.discard()
+        self.document_changed()
 
-                self.textEdit.setPlainText(content)
-                self.current_file = file_path
-                self.is_modified = False
-                file_name = os.path.basename(file_path)
-                self.fileNameLabel.setText(file_name)
-                self.update_title()
-                self.statusbar.showMessage(f"Файл открыт (кодировка Windows-1251): {file_path}")
+        self.large_file = document
+        self.textEdit.hide()
+        self.largeView.set_document(document)
+        self.largeView.show()
+        self.largeView.setFocus()
+
+        self.current_file = file_path
+        self.is_modified = False
+        self.encoding = document.encoding
+        self.fileNameLabel.setText(os.path.basename(file_path))
+        self.update_title()
+
+        self.index_worker = LineIndexWorker(document.index, self)
+        self.index_worker.progressChanged.connect(self.show_index_progress)
+        self.index_worker.indexFinished.connect(self.index_finished)
+        self.index_worker.indexFailed.connect(self.show_error)
+        self.index_worker.start()
+        self.statusbar.showMessage(f"Индексация строк: {file_path}")
+
+    def close_large_file(self):
+        """Выход из режима большого файла"""
+        self.cancel_search(wait=True)
+        if self.index_worker is not None:
+            self.index_worker.cancel()
+            self.index_worker.wait()
+            self.index_worker = None
+        if self.large_file is not None:
+            self.largeView.set_document(None)
+            self.large_file.close()
+            self.large_file = None
+        if self.temp_backing is not None:
+            remove_temp(self.temp_backing)
+            self.temp_backing = None
+        self.largeView.hide()
+        self.textEdit.show()
+
+    def show_index_progress(self, bytes_done):
+        if self.large_file is None:
+            return
+        percent = bytes_done * 100 // max(1, self.large_file.size)
+        self.largeView.update_scrollbars()
+        self.statusbar.showMessage(
+            f"Индексация строк: {percent}% ({self.large_file.index.line_count} строк)")
+
+    def index_finished(self):
+        if self.large_file is None:
+            return
+        # После индексации файл можно править через таблицу кусков
+        self.large_file.enable_editing()
+        self.large_file.table.listener = self.record_large_change
+        self.largeView.set_read_only(self.io_worker is not None)
+        self.largeView.update_scrollbars()
+        self.statusbar.showMessage(
+            f"Файл открыт (кодировка {ENCODING_NAMES[self.encoding]}, "
+            f"{self.large_file.line_count} строк): {self.large_file.path}")
+        self.apply_recovery(UNITS_BYTES)
+
+    def ensure_journal(self, units):
+        if not self.journal.active:
+            self.journal.begin(journal_header(self.current_file, units, self.encoding))
+
+    def record_text_change(self, position, removed, added):
+        """Запись правки QTextEdit в журнал (позиции в символах документа)"""
+        if self.large_file is not None:
+            return
+        self.document_changed()
+        if self.journal_paused:
+            return
+        document = self.textEdit.document()
+        cursor = QTextCursor(document)
+        end = min(position + added, document.characterCount() - 1)
+        cursor.setPosition(min(position, end))
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        inserted = cursor.selectedText().replace('\u2029', '\n')
+        self.ensure_journal(UNITS_CHARS)
+        self.journal.record(position, removed, inserted)
+
+    def record_large_change(self, offset, removed, inserted):
+        """Запись правки таблицы кусков в журнал (позиции в байтах)"""
+        self.document_changed()
+        self.ensure_journal(UNITS_BYTES)
+        self.journal.record(offset, removed, inserted.decode('latin-1'))
 
-            except Exception as e:
-                self.show_error(f"Ошибка при открытии файла: {str(e)}")
+    def check_recovery(self):
+        """Предложение восстановить правки после аварийного завершения"""
+        journals = find_journals()
+        if not journals:
+            return
+        journal_path, header, entries = journals[0]
+        name = os.path.basename(header['path']) if header['path'] else "Новый файл"
 
+        if not entries or not journal_matches_file(header):
+            if entries:
+                QMessageBox.warning(self, "Восстановление",
+                                    f"Файл {name} изменился после сбоя, "
+                                    f"несохраненные правки восстановить нельзя")
+            remove_journal(journal_path)
+            return
+
+        created = time.strftime('%d.%m.%Y %H:%M', time.localtime(header['created']))
+        reply = QMessageBox.question(
+            self,
+            "Восстановление",
+            f"Найдены несохраненные правки файла {name} ({created}). Восстановить?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            remove_journal(journal_path)
+            return
+
+        self.pending_recovery = (journal_path, header, entries)
+        if header['path'] is None:
+            self.apply_recovery(UNITS_CHARS)
+        else:
+            self.load_file(header['path'])
+
+    def apply_recovery(self, units):
+        """Повтор правок из журнала поверх только что открытого файла"""
+        if self.pending_recovery is None:
+            return
+        journal_path, header, entries = self.pending_recovery
+        self.pending_recovery = None
+        if header['units'] != units:
+            self.show_error("Журнал правок не подходит к открытому файлу")
+            return
+
+        try:
+            if units == UNITS_BYTES:
+                self.large_file.replay(entries)
+                self.largeView.update_scrollbars()
+                self.text_modified()
+            else:
+                document = self.textEdit.document()
+                cursor = QTextCursor(document)
+                cursor.beginEditBlock()
+                for position, removed, inserted in entries:
+                    end = document.characterCount() - 1
+                    cursor.setPosition(min(position, end))
+                    cursor.setPosition(min(position + removed, end), QTextCursor.KeepAnchor)
+                    cursor.insertText(inserted)
+                cursor.endEditBlock()
         except Exception as e:
-            self.show_error(f"Ошибка при открытии файла: {str(e)}")
+            self.show_error(f"Ошибка при восстановлении правок: {str(e)}")
+            return
+
+        # Повторенные правки уже записаны в новый журнал
+        remove_journal(journal_path)
+        self.statusbar.showMessage(f"Восстановлено правок: {len(entries)}")
+
+    def document_changed(self):
+        """Правка документа: найденные совпадения и индексы поиска устарели"""
+        self.document_version += 1
+        if self.search is not None or self.search_cache:
+            self.cancel_search()
+            self.search = None
+            self.search_cache.clear()
+        self.current_match = None
+
+    def show_search_panel(self, replace=False):
+        self.searchPanel.show()
+        field = self.replaceLineEdit if replace else self.findLineEdit
+        field.setFocus()
+        field.selectAll()
+
+    def hide_search_panel(self):
+        self.cancel_search()
+        self.searchPanel.hide()
+        (self.largeView if self.large_file is not None else self.textEdit).setFocus()
+
+    def search_key(self):
+        query = self.findLineEdit.text()
+        if not query:
+            return None
+        regex = self.regexCheckBox.isChecked()
+        # Замена по регулярному выражению раскрывается при поиске, пока
+        # совпадение еще в контексте (просмотр вперед и назад, ^, \b), поэтому
+        # шаблон входит в ключ
+        template = self.replaceLineEdit.text() if regex else None
+        return (self.document_version, query, regex, self.caseCheckBox.isChecked(), template)
+
+    def search_document(self):
+        """Снимок документа для поиска в фоне (None, если большой файл еще индексируется)"""
+        if self.large_file is None:
+            return TextSource(self.textEdit.toPlainText())
+        if self.large_file.table is None:
+            return None
+        return BytesSource(self.large_file.iter_chunks(), self.large_file.length,
+                           self.large_file.text_encoding)
+
+    def start_search(self, key, replacement=None):
+        """Запуск фонового поиска по запросу key; False, если он невозможен"""
+        version, query, regex, case_sensitive, template = key
+        try:
+            pattern = compile_query(query, regex, case_sensitive)
+        except re.error as e:
+            self.statusbar.showMessage(f"Ошибка в регулярном выражении: {str(e)}")
+            return False
+        if replacement is None and template is not None:
+            # Неверный шаблон не мешает поиску: ошибка покажется при замене
+            try:
+                pattern.sub(template, '')
+            except (re.error, IndexError):
+                template = None
+        source = self.search_document()
+        if source is None:
+            self.statusbar.showMessage("Дождитесь окончания индексации строк")
+            return False
+
+        # Повторный поиск в неизмененном документе просматривает только
+        # блоки, где есть все триграммы запроса
+        candidates = None
+        build_index = False
+        if self.trigram_index is not None and self.trigram_index[0] == version:
+            if not regex:
+                candidates = self.trigram_index[1].candidates(query)
+        else:
+            build_index = NUMPY_AVAILABLE and source.size <= TRIGRAM_INDEX_LIMIT
+
+        self.cancel_search()
+        self.search = SearchState(key, replacing=replacement is not None)
+        worker = SearchWorker(source, pattern, template if replacement is None else replacement,
+                              regex, candidates, build_index, self)
+        worker.matchesFound.connect(lambda batch: self.search_matches_found(worker, batch))
+        worker.progressChanged.connect(
+            lambda done, total: self.search_progress(worker, done, total))
+        worker.searchFinished.connect(lambda index: self.search_finished(worker, index))
+        worker.searchFailed.connect(lambda message: self.search_failed(worker, message))
+        worker.finished.connect(worker.deleteLater)
+        self.search_worker = worker
+        worker.start()
+        return True
+
+    def cancel_search(self, wait=False):
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+            if wait:
+                self.search_worker.wait()
+            self.search_worker = None
+        self.navigate_pending = False
+
+    def search_matches_found(self, worker, batch):
+        if worker is not self.search_worker:
+            return
+        self.search.add(batch)
+        if self.navigate_pending:
+            self.navigate()
+
+    def search_progress(self, worker, done, total):
+        if worker is not self.search_worker or not self.navigate_pending and not self.search.replacing:
+            return
+        percent = done * 100 // total if total else 100
+        self.statusbar.showMessage(f"Поиск: {percent}%, найдено {len(self.search.matches)}")
+
+    def search_finished(self, worker, index):
+        if worker is not self.search_worker:
+            return
+        self.search_worker = None
+        search = self.search
+        search.complete = True
+        if index is not None:
+            self.trigram_index = (search.key[0], index)
+
+        if search.replacing:
+            self.search = None
+            self.apply_replace_all(search)
+            return
+        self.search_cache[search.key] = search
+        if self.navigate_pending:
+            self.navigate()
+
+    def search_failed(self, worker, message):
+        if worker is not self.search_worker:
+            return
+        self.search_worker = None
+        self.search = None
+        self.navigate_pending = False
+        self.show_error(message)
+
+    def find_next(self):
+        """Переход к следующему совпадению после курсора"""
+        key = self.search_key()
+        if key is None:
+            self.show_search_panel()
+            return
+        if self.search is None or self.search.key != key or self.search.replacing:
+            cached = self.search_cache.get(key)
+            if cached is not None:
+                self.search = cached
+            elif not self.start_search(key):
+                return
+        self.navigate_pending = True
+        self.navigate()
+
+    def cursor_offset(self):
+        if self.large_file is None:
+            return self.textEdit.textCursor().position()
+        return self.large_file.offset(self.largeView.cursor_line, self.largeView.cursor_column)
+
+    def set_cursor_offset(self, offset):
+        if self.large_file is None:
+            cursor = self.textEdit.textCursor()
+            cursor.setPosition(offset)
+            self.textEdit.setTextCursor(cursor)
+        else:
+            self.largeView.set_cursor(*self.large_file.position(offset))
+
+    def navigate(self):
+        """Выделение ближайшего совпадения после курсора (когда оно уже найдено)"""
+        search = self.search
+        number = bisect_left(search.offsets, self.cursor_offset())
+        if number < len(search.offsets):
+            self.select_match(number)
+        elif search.complete:
+            if search.offsets:
+                self.select_match(0)
+                self.statusbar.showMessage(self.statusbar.currentMessage() +
+                                           " (поиск продолжен с начала)")
+            else:
+                self.statusbar.showMessage(f"Не найдено: {search.key[1]}")
+        else:
+            return
+        self.navigate_pending = False
+
+    def select_match(self, number):
+        match = self.search.matches[number]
+        offset, length = match[:2]
+        if self.large_file is None:
+            cursor = QTextCursor(self.textEdit.document())
+            cursor.setPosition(offset)
+            cursor.setPosition(offset + length, QTextCursor.KeepAnchor)
+            self.textEdit.setTextCursor(cursor)
+            line = cursor.blockNumber() + 1
+        else:
+            start = self.large_file.position(offset)
+            self.largeView.set_selection(start, self.large_file.position(offset + length))
+            line = start[0] + 1
+
+        # Раскрытая при поиске замена (None, если шаблон не нужен или неверен)
+        self.current_match = (self.search.key, offset, length, match[2] if len(match) > 2 else None)
+        total = f"{len(self.search.offsets)}{'' if self.search.complete else '+'}"
+        self.statusbar.showMessage(f"Совпадение {number + 1} из {total}, строка {line}")
+
+    def replace_current(self):
+        """Замена выделенного совпадения и переход к следующему"""
+        key = self.search_key()
+        if key is None or self.io_worker is not None:
+            return
+        if self.current_match is None or self.current_match[0] != key:
+            if self.current_match is not None and self.current_match[0][0] == self.document_version:
+                # Запрос или шаблон изменился: ищем заново от начала выделения
+                self.set_cursor_offset(self.current_match[1])
+            self.find_next()
+            return
+        _, offset, length, replacement = self.current_match
+
+        try:
+            if replacement is None:
+                replacement = self.replaceLineEdit.text()
+                if key[2]:
+                    # Шаблон не разобрался при поиске: показываем ошибку
+                    compile_query(*key[1:4]).sub(replacement, '')
+            if self.large_file is None:
+                cursor = self.textEdit.textCursor()
+                cursor.setPosition(offset)
+                cursor.setPosition(offset + length, QTextCursor.KeepAnchor)
+                cursor.insertText(replacement)
+                self.textEdit.setTextCursor(cursor)
+            else:
+                document = self.large_file
+                document.replace_ranges([(offset, length, replacement)])
+                self.largeView.update_scrollbars()
+                self.largeView.set_cursor(
+                    *document.position(offset + len(document.encode_inserted(replacement))))
+                self.text_modified()
+        except (re.error, IndexError) as e:
+            self.statusbar.showMessage(f"Ошибка в шаблоне замены: {str(e)}")
+            return
+        except UnicodeEncodeError:
+            self.statusbar.showMessage("Символы замены нельзя записать в кодировке файла")
+            return
+        self.find_next()
+
+    def replace_all(self):
+        """Замена всех совпадений одной правкой (одним шагом отмены)"""
+        key = self.search_key()
+        if key is None or self.io_worker is not None:
+            return
+        replacement = self.replaceLineEdit.text()
+        if self.start_search(key, replacement):
+            self.statusbar.showMessage("Поиск совпадений для замены...")
+
+    def apply_replace_all(self, search):
+        if search.key[0] != self.document_version:
+            self.statusbar.showMessage("Документ изменился во время поиска, замена отменена")
+            return
+        if not search.matches:
+            self.statusbar.showMessage(f"Не найдено: {search.key[1]}")
+            return
+
+        try:
+            if self.large_file is None:
+                cursor = QTextCursor(self.textEdit.document())
+                cursor.beginEditBlock()
+                for offset, length, text in reversed(search.matches):
+                    cursor.setPosition(offset)
+                    cursor.setPosition(offset + length, QTextCursor.KeepAnchor)
+                    cursor.insertText(text)
+                cursor.endEditBlock()
+            else:
+                self.large_file.replace_ranges(search.matches)
+                self.largeView.selection = None
+                self.largeView.update_scrollbars()
+                self.largeView.set_cursor(self.largeView.cursor_line, self.largeView.cursor_column)
+                self.text_modified()
+        except UnicodeEncodeError:
+            self.statusbar.showMessage("Символы замены нельзя записать в кодировке файла")
+            return
+        self.statusbar.showMessage(f"Заменено: {len(search.matches)}")
 
-    def save_file(self):
+    def go_to_line(self):
+        """Переход к строке по номеру"""
+        if self.large_file is not None:
+            line_count = self.large_file.line_count
+            current = self.largeView.cursor_line + 1
+        else:
+            line_count = self.textEdit.document().blockCount()
+            current = self.textEdit.textCursor().blockNumber() + 1
+
+        line, ok = QInputDialog.getInt(self, "Переход к строке",
+                                       f"Номер строки (1-{line_count}):",
+                                       current, 1, line_count)
+        if not ok:
+            return
+
+        if self.large_file is not None:
+            self.largeView.scroll_to_line(line - 1)
+            self.largeView.set_cursor(line - 1, 0)
+            self.largeView.setFocus()
+        else:
+            block = self.textEdit.document().findBlockByNumber(line - 1)
+            self.textEdit.setTextCursor(QTextCursor(block))
+            self.textEdit.setFocus()
+
+    def save_file(self, wait=False):
         """Сохранение файла"""
         if self.current_file:
             # Сохраняем в текущий файл
-            self.save_to_file(self.current_file)
+            return self.save_to_file(self.current_file, wait)
         else:
             # Сохраняем как новый файл
-            self.save_file_as()
+            return self.save_file_as(wait)
 
-    def save_file_as(self):
+    def save_file_as(self, wait=False):
         """Сохранение файла с выбором имени"""
         file_path, _ = QFileDialog.getSaveFileName(
             self,
@@ -112,33 +986,182 @@ class TextEditor(QtWidgets.QMainWindow):
         )
 
         if file_path:
-            self.save_to_file(file_path)
-            return True
+            return self.save_to_file(file_path, wait)
         return False
 
-    def save_to_file(self, file_path):
-        """Сохранение содержимого в файл"""
-        try:
+    def save_to_file(self, file_path, wait=False):
+        """Сохранение содержимого в файл
+
+        Запись идет в фоне во временный файл, который затем заменяет целевой.
+        При wait=True метод дожидается конца записи и возвращает ее успех.
+        """
+        if self.large_file is not None:
+            if (not self.is_modified and self.current_file
+                    and os.path.abspath(file_path) == os.path.abspath(self.current_file)):
+                self.statusbar.showMessage(f"Файл сохранен: {file_path}")
+                return True
+
+            # Куски пишутся прямо из отображенного файла и буфера добавленного
+            # текста во временный файл
+            chunks = self.large_file.iter_chunks()
+            length = self.large_file.length
+            encoding = self.encoding
+
+            if os.path.abspath(file_path) == os.path.abspath(self.large_file.path):
+                # Отображенный в память файл нельзя заменить (в Windows):
+                # замена - после закрытия отображения, в save_over_mapped
+                def task(progress):
+                    return write_temp(file_path, chunks, length, progress)
+
+                started = self.start_io(
+                    task,
+                    lambda temp_path: self.save_over_mapped(temp_path, file_path, encoding),
+                    lambda error: self.show_error(f"Ошибка при сохранении файла: {str(error)}"),
+                    f"Сохранение файла: {file_path}",
+                )
+                if started and wait:
+                    return self.wait_for_io()
+                return started
+
+            def task(progress):
+                atomic_write(file_path, chunks, length, progress)
+                return encoding
+        else:
             content = self.textEdit.toPlainText()
+            encoding = self.encoding
 
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(content)
+            def task(progress):
+                data, used_encoding = encode_text(content, encoding)
+                atomic_write(file_path, iter_bytes_chunks(data), len(data), progress)
+                return used_encoding
 
-            self.current_file = file_path
-            self.is_modified = False
+        started = self.start_io(
+            task,
+            lambda used_encoding: self.save_finished(file_path, used_encoding),
+            lambda error: self.show_error(f"Ошибка при сохранении файла: {str(error)}"),
+            f"Сохранение файла: {file_path}",
+        )
+        if started and wait:
+            return self.wait_for_io()
+        return started
 
-            # Обновление интерфейса
-            file_name = os.path.basename(file_path)
-            self.fileNameLabel.setText(file_name)
-            self.update_title()
-            self.statusbar.showMessage(f"Файл сохранен: {file_path}")
+    def save_over_mapped(self, temp_path, file_path, encoding):
+        """Замена открытого большого файла сохраненной копией и ее открытие
 
-            return True
+        Таблица кусков ссылается на старое отображение, поэтому после замены
+        файл открывается заново (индекс строк строится снова, история отмены
+        начинается с сохраненного состояния).
+        """
+        self.close_large_file()
+        try:
+            replace_with_temp(temp_path, file_path)
+        except OSError as e:
+            # Файл не заменен (например, занят другой программой): правки
+            # есть только во временном файле, он и открывается как документ
+            self.io_worker.succeeded = False
+            self.show_error(f"Ошибка при сохранении файла: {str(e)}")
+            if self.reopen_saved(temp_path, lambda result: self.unsaved_loaded(
+                    temp_path, file_path, *result)):
+                self.temp_backing = temp_path
+                self.current_file = file_path
+                self.is_modified = True
+                self.fileNameLabel.setText(os.path.basename(file_path))
+                self.update_title()
+            return
+
+        self.reopen_saved(file_path)
+        self.save_finished(file_path, encoding)
 
+    def reopen_saved(self, file_path, finished=None):
+        """Открытие только что записанного файла вместо закрытого отображения
+
+        Если файл не отображается в память (например, он стал пустым), он
+        читается в QTextEdit, как только закончится текущая операция;
+        тогда возвращается False.
+        """
+        try:
+            self.open_large_file(file_path)
+            return True
         except Exception as e:
-            self.show_error(f"Ошибка при сохранении файла: {str(e)}")
+            self.after_io = lambda: self.load_text_file(file_path, finished)
+            self.show_error(f"Ошибка при открытии сохраненного файла: {str(e)}")
+            return False
+
+    def unsaved_loaded(self, temp_path, file_path, content, encoding):
+        """Временный файл с несохраненными правками прочитан в QTextEdit"""
+        self.load_finished(file_path, content, encoding)
+        remove_temp(temp_path)
+        self.is_modified = True
+        self.update_title()
+
+    def save_finished(self, file_path, encoding):
+        changed_encoding = encoding != self.encoding
+        self.journal.discard()
+        self.current_file = file_path
+        self.is_modified = False
+        self.encoding = encoding
+
+        # Обновление интерфейса
+        self.fileNameLabel.setText(os.path.basename(self.current_file))
+        self.update_title()
+        if changed_encoding:
+            self.statusbar.showMessage(
+                f"Файл сохранен в {ENCODING_NAMES[encoding]}: текст содержит символы, "
+                f"которых нет в исходной кодировке: {file_path}")
+        else:
+            self.statusbar.showMessage(f"Файл сохранен: {file_path}")
+
+    def start_io(self, task, finished, failed, message):
+        """Запуск фоновой операции с файлом; False, если уже идет другая"""
+        if self.io_worker is not None:
+            self.statusbar.showMessage("Дождитесь завершения операции с файлом")
             return False
 
+        self.io_worker = FileTaskWorker(task, self)
+        self.io_worker.progressChanged.connect(self.show_io_progress)
+        # io_finished - первым: обработчик результата еще может счесть операцию неудачной
+        self.io_worker.taskFinished.connect(self.io_finished)
+        self.io_worker.taskFinished.connect(finished)
+        self.io_worker.taskFailed.connect(failed)
+        self.io_worker.finished.connect(self.io_stopped)
+        self.set_busy(True)
+        self.statusbar.showMessage(message)
+        self.io_worker.start()
+        return True
+
+    def io_finished(self, result):
+        self.io_worker.succeeded = True
+
+    def io_stopped(self):
+        self.io_worker = None
+        self.set_busy(False)
+        if self.after_io is not None:
+            after_io, self.after_io = self.after_io, None
+            after_io()
+
+    def wait_for_io(self):
+        """Ожидание конца фоновой операции (и запущенной после нее) без блокировки
+        интерфейса; успех первой из них"""
+        worker = self.io_worker
+        while self.io_worker is not None:
+            QApplication.processEvents(QEventLoop.WaitForMoreEvents)
+        return worker is not None and worker.succeeded
+
+    def show_io_progress(self, done, total):
+        self.progressBar.setValue(done * 100 // total if total else 100)
+
+    def set_busy(self, busy):
+        """На время чтения и записи текст доступен только для просмотра"""
+        self.textEdit.setReadOnly(busy)
+        self.largeView.set_read_only(busy or self.large_file is None
+                                     or self.large_file.table is None)
+        for widget in (self.newButton, self.openButton, self.saveButton, self.replaceButton,
+                       self.replaceAllButton, self.actionNew, self.actionOpen, self.actionSave,
+                       self.actionReplace):
+            widget.setEnabled(not busy)
+        self.progressBar.setValue(0)
+        self.progressBar.setVisible(busy)
+
     def text_modified(self):
         """Обработчик изменения текста"""
         if not self.is_modified:
@@ -156,7 +1179,7 @@ class TextEditor(QtWidgets.QMainWindow):
             )
 
             if reply == QMessageBox.Save:
-                return self.save_file()
+                return self.save_file(wait=True)
             elif reply == QMessageBox.Cancel:
                 return False
 
@@ -183,7 +1206,13 @@ class TextEditor(QtWidgets.QMainWindow):
 
     def closeEvent(self, event):
         """Обработчик закрытия окна"""
+        self.wait_for_io()
         if self.check_save():
+            self.cancel_search(wait=True)
+            self.close_large_file()
+            self.journal_timer.stop()
+            self.journal.discard()
+            self.journal.close()
             event.accept()
         else:
             event.ignore()
@@ -1,9 +1,17 @@
 import sys
 import os
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QFileDialog, QMessageBox, QApplication
 from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QPixmap, QImage, QTransform, QColor
+from PyQt5.QtGui import QPixmap
+
+from ui_loader import load_ui
+from image_processing import (
+    CHANNEL_ORIGINAL, CHANNEL_RED, CHANNEL_GREEN, CHANNEL_BLUE, CHANNEL_GRAYSCALE, FrameCache,
+    PREVIEW_SIZE, MipPyramid, FilterPipeline, ChannelFilter, Rotate, read_square_image,
+    rotate_lossless, render_preview,
+)
+from render_scheduler import RenderScheduler
 
 
 class ImageEditor(QtWidgets.QMainWindow):
@@ -11,15 +19,29 @@ class ImageEditor(QtWidgets.QMainWindow):
         super().__init__()
 
         # Загрузка интерфейса из файла
-        uic.loadUi('image_editor.ui', self)
+        load_ui('image_editor.ui', self)
 
         # Инициализация переменных
-        self.original_pixmap = None
-        self.current_pixmap = None
+        self.pyramid = None
         self.rotation_angle = 0
 
+        # Показывается уменьшенная копия; полное разрешение большого
+        # изображения декодируется только при сохранении
+        self.file_path = None
+        self.full_resolution = False
+
+        # Обработанные кадры: повторный показ того же вида берется из кэша
+        self.frame_cache = FrameCache()
+
+        # Обработка кадров для показа идет в фоновом потоке
+        self.render_scheduler = RenderScheduler(self)
+        self.render_scheduler.frameReady.connect(self.frame_ready)
+        self.render_scheduler.renderFailed.connect(self.render_failed)
+        self.last_frame = None
+
         # Подключение сигналов
         self.loadButton.clicked.connect(self.load_image)
+        self.saveButton.clicked.connect(self.save_image)
         self.rotateLeftButton.clicked.connect(self.rotate_left)
         self.rotateRightButton.clicked.connect(self.rotate_right)
         self.resetRotationButton.clicked.connect(self.reset_rotation)
@@ -48,24 +70,21 @@ class ImageEditor(QtWidgets.QMainWindow):
 
         if file_path:
             try:
-                # Загрузка изображения с помощью QPixmap
-                pixmap = QPixmap(file_path)
-                if pixmap.isNull():
+                # Квадрат (изображение обрезается до квадратной формы) сразу
+                # декодируется уменьшенным: на экран больше не поместится
+                image, side, cropped = read_square_image(file_path, PREVIEW_SIZE)
+                if image.isNull():
                     self.show_error("Не удалось загрузить изображение")
                     return
 
-                # Проверка, что изображение квадратное
-                if pixmap.width() != pixmap.height():
-                    # Если не квадратное, делаем его квадратным
-                    size = min(pixmap.width(), pixmap.height())
-                    pixmap = pixmap.copy(0, 0, size, size)
-                    QMessageBox.information(self, "Информация",
-                                            "Изображение было обрезано до квадратной формы")
-
-                # Сохранение оригинального изображения
-                self.original_pixmap = pixmap
-                self.current_pixmap = pixmap
+                self.file_path = file_path
+                self.frame_cache.clear()
+                self.last_frame = None
                 self.rotation_angle = 0
+                self.full_resolution = side <= PREVIEW_SIZE
+
+                # Уменьшенные копии для показа: полное разрешение нужно только при сохранении
+                self.pyramid = MipPyramid(image)
 
                 # Обновление интерфейса
                 file_name = os.path.basename(file_path)
@@ -73,48 +92,39 @@ class ImageEditor(QtWidgets.QMainWindow):
                 self.update_image_display()
                 self.update_controls()
 
+                if cropped:
+                    QMessageBox.information(self, "Информация",
+                                            "Изображение было обрезано до квадратной формы")
+
                 self.statusbar.showMessage(f"Изображение загружено: {file_name}")
 
             except Exception as e:
                 self.show_error(f"Ошибка при загрузке изображения: {str(e)}")
 
-    def apply_color_channel(self, pixmap):
-        """Применение выбранного цветового канала"""
-        if self.originalRadio.isChecked() or self.original_pixmap is None:
-            return pixmap
-
-        # Создаем QImage для манипуляций с пикселями
-        image = pixmap.toImage()
-
-        # Обрабатываем каждый пиксель
-        for x in range(image.width()):
-            for y in range(image.height()):
-                color = image.pixelColor(x, y)
-                r, g, b = color.red(), color.green(), color.blue()
-
-                if self.redChannelRadio.isChecked():
-                    # Оставляем только красный канал
-                    new_color = QColor(r, 0, 0)
-                elif self.greenChannelRadio.isChecked():
-                    # Оставляем только зеленый канал
-                    new_color = QColor(0, g, 0)
-                elif self.blueChannelRadio.isChecked():
-                    # Оставляем только синий канал
-                    new_color = QColor(0, 0, b)
-                elif self.grayscaleRadio.isChecked():
-                    # Конвертация в оттенки серого
-                    gray = int(0.299 * r + 0.587 * g + 0.114 * b)
-                    new_color = QColor(gray, gray, gray)
-                else:
-                    new_color = color
-
-                image.setPixelColor(x, y, new_color)
-
-        return QPixmap.fromImage(image)
+    def full_image(self):
+        """Изображение в полном разрешении
+
+        Большое изображение декодируется заново из файла и не остается в памяти.
+        """
+        if self.full_resolution:
+            return self.pyramid.full
+        return read_square_image(self.file_path)[0]
+
+    def current_channel(self):
+        """Выбранный режим цветового канала"""
+        if self.redChannelRadio.isChecked():
+            return CHANNEL_RED
+        if self.greenChannelRadio.isChecked():
+            return CHANNEL_GREEN
+        if self.blueChannelRadio.isChecked():
+            return CHANNEL_BLUE
+        if self.grayscaleRadio.isChecked():
+            return CHANNEL_GRAYSCALE
+        return CHANNEL_ORIGINAL
 
     def rotate_image(self, angle):
         """Поворот изображения"""
-        if self.current_pixmap:
+        if self.pyramid is not None:
             self.rotation_angle = (self.rotation_angle + angle) % 360
             self.update_image_display()
 
@@ -136,34 +146,106 @@ class ImageEditor(QtWidgets.QMainWindow):
 
     def update_image_display(self):
         """Обновление отображения изображения"""
-        if self.current_pixmap is None:
+        if self.pyramid is None:
             return
 
         try:
-            # Применяем поворот
-            transform = QTransform().rotate(self.rotation_angle)
-            rotated_pixmap = self.current_pixmap.transformed(transform, Qt.SmoothTransformation)
+            label_size = self.imageLabel.size()
+            width, height = label_size.width() - 20, label_size.height() - 20
+            channel = self.current_channel()
+            angle = self.rotation_angle
+            key = (self.pyramid.full.cacheKey(), angle, channel, (width, height))
+
+            scaled_pixmap = self.frame_cache.get(key)
+            if scaled_pixmap is not None:
+                self.render_scheduler.cancel()
+                self.show_frame(scaled_pixmap, angle)
+                return
+
+            # Уровень пирамиды под размер окна (до поворота стороны меняются местами)
+            if angle % 180:
+                level = self.pyramid.level_for(height, width)
+            else:
+                level = self.pyramid.level_for(width, height)
+
+            # Результат фильтра канала один на все повороты и размеры окна
+            channel_key = (level.cacheKey(), 0, channel, None)
+            processed = self.frame_cache.get(channel_key)
+
+            # Фильтр, поворот и масштабирование - в фоне; серия изменений размера
+            # окна дает одну отрисовку, а пока ее нет, растягивается прошлый кадр
+            self.show_placeholder(width, height)
+            self.render_scheduler.request(key, lambda: (
+                channel_key, *render_preview(level, channel, angle, width, height, processed)
+            ))
 
-            # Применяем цветовой канал
-            processed_pixmap = self.apply_color_channel(rotated_pixmap)
+        except Exception as e:
+            self.show_error(f"Ошибка при обработке изображения: {str(e)}")
 
-            # Масштабирование для отображения с сохранением пропорций
-            label_size = self.imageLabel.size()
-            scaled_pixmap = processed_pixmap.scaled(
-                label_size.width() - 20,
-                label_size.height() - 20,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
+    def frame_ready(self, key, result):
+        """Готов кадр из фонового потока"""
+        channel_key, processed, scaled = result
+        if channel_key[2] != CHANNEL_ORIGINAL:
+            self.frame_cache.put(channel_key, processed)
+        self.show_frame(self.frame_cache.put(key, QPixmap.fromImage(scaled)), key[1])
+
+    def render_failed(self, error):
+        self.show_error(f"Ошибка при обработке изображения: {str(error)}")
+
+    def show_frame(self, pixmap, angle):
+        self.last_frame = (pixmap, angle)
+        self.imageLabel.setPixmap(pixmap)
+
+    def show_placeholder(self, width, height):
+        """Быстро растянутый прошлый кадр (или самая маленькая копия изображения)"""
+        if self.last_frame is not None:
+            pixmap, angle = self.last_frame
+        else:
+            pixmap, angle = QPixmap.fromImage(self.pyramid.levels[-1]), 0
+        pixmap = rotate_lossless(pixmap, self.rotation_angle - angle)
+        self.imageLabel.setPixmap(pixmap.scaled(width, height, Qt.KeepAspectRatio, Qt.FastTransformation))
+
+    def save_image(self):
+        """Сохранение обработанного изображения в полном разрешении"""
+        if self.pyramid is None:
+            QMessageBox.warning(self, "Предупреждение", "Сначала загрузите изображение")
+            return
+
+        try:
+            file_path, _ = QFileDialog.getSaveFileName(
+                self,
+                "Сохранить изображение",
+                "",
+                "PNG Images (*.png);;JPEG Images (*.jpg *.jpeg);;BMP Images (*.bmp);;All Files (*)"
             )
 
-            self.imageLabel.setPixmap(scaled_pixmap)
+            if file_path:
+                # Только здесь фильтр и поворот применяются к полному разрешению,
+                # за один проход по изображению
+                pipeline = FilterPipeline([ChannelFilter(self.current_channel()), Rotate(self.rotation_angle)])
+                QApplication.setOverrideCursor(Qt.WaitCursor)
+                try:
+                    image = self.full_image()
+                    if image.isNull():
+                        self.show_error("Не удалось загрузить полное разрешение изображения")
+                        return
+                    success = pipeline.run(image).save(file_path)
+                finally:
+                    QApplication.restoreOverrideCursor()
+
+                if success:
+                    self.statusbar.showMessage(f"Изображение сохранено: {file_path}")
+                    QMessageBox.information(self, "Успех", f"Изображение успешно сохранено в файл:\n{file_path}")
+                else:
+                    self.show_error("Не удалось сохранить изображение")
 
         except Exception as e:
-            self.show_error(f"Ошибка при обработке изображения: {str(e)}")
+            self.show_error(f"Ошибка при сохранении изображения: {str(e)}")
 
     def update_controls(self):
         """Обновление состояния элементов управления"""
-        has_image = self.current_pixmap is not None
+        has_image = self.pyramid is not None
+        self.saveButton.setEnabled(has_image)
         self.originalRadio.setEnabled(has_image)
         self.redChannelRadio.setEnabled(has_image)
         self.greenChannelRadio.setEnabled(has_image)
@@ -183,6 +265,11 @@ class ImageEditor(QtWidgets.QMainWindow):
         super().resizeEvent(event)
         self.update_image_display()
 
+    def closeEvent(self, event):
+        """Обработчик закрытия окна"""
+        self.render_scheduler.shutdown()
+        event.accept()
+
 
 def main():
     app = QApplication(sys.argv)
@@ -1,9 +1,13 @@
 import sys
 import os
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QFileDialog, QMessageBox, QApplication
 from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QPixmap, QImage, QPainter
+from PyQt5.QtGui import QPixmap
+
+from ui_loader import load_ui
+from image_processing import apply_opacity
+from render_scheduler import RenderScheduler
 
 
 class AlphaImageEditor(QtWidgets.QMainWindow):
@@ -11,12 +15,19 @@ class AlphaImageEditor(QtWidgets.QMainWindow):
         super().__init__()
 
         # Загрузка интерфейса из файла
-        uic.loadUi('alpha_editor.ui', self)
+        load_ui('alpha_editor.ui', self)
 
         # Инициализация переменных
         self.original_pixmap = None
+        self.original_image = None
         self.current_alpha = 100  # 100% - полностью непрозрачное
 
+        # Обработка кадров для показа идет в фоновом потоке
+        self.render_scheduler = RenderScheduler(self)
+        self.render_scheduler.frameReady.connect(self.frame_ready)
+        self.render_scheduler.renderFailed.connect(self.render_failed)
+        self.last_frame = None
+
         # Подключение сигналов
         self.loadButton.clicked.connect(self.load_image)
         self.alphaSlider.valueChanged.connect(self.slider_changed)
@@ -46,6 +57,8 @@ class AlphaImageEditor(QtWidgets.QMainWindow):
 
                 # Сохранение оригинального изображения
                 self.original_pixmap = pixmap
+                self.original_image = pixmap.toImage()
+                self.last_frame = None
                 self.current_alpha = 100
 
                 # Сброс слайдера к 100%
@@ -62,27 +75,6 @@ class AlphaImageEditor(QtWidgets.QMainWindow):
             except Exception as e:
                 self.show_error(f"Ошибка при загрузке изображения: {str(e)}")
 
-    def apply_alpha_channel(self, pixmap, alpha):
-        """Применение альфа-канала к изображению"""
-        if pixmap is None:
-            return None
-
-        # Создаем прозрачное изображение того же размера
-        transparent_pixmap = QPixmap(pixmap.size())
-        transparent_pixmap.fill(Qt.transparent)
-
-        # Создаем QPainter для рисования на прозрачном pixmap
-        painter = QPainter(transparent_pixmap)
-
-        # Устанавливаем непрозрачность (альфа-канал)
-        painter.setOpacity(alpha / 100.0)
-
-        # Рисуем оригинальное изображение
-        painter.drawPixmap(0, 0, pixmap)
-        painter.end()
-
-        return transparent_pixmap
-
     def slider_changed(self, value):
         """Обработчик изменения положения слайдера"""
         self.current_alpha = value
@@ -96,27 +88,39 @@ class AlphaImageEditor(QtWidgets.QMainWindow):
             return
 
         try:
-            # Применяем альфа-канал
-            transparent_pixmap = self.apply_alpha_channel(
-                self.original_pixmap,
-                self.current_alpha
-            )
-
-            if transparent_pixmap:
-                # Масштабирование для отображения с сохранением пропорций
-                label_size = self.imageLabel.size()
-                scaled_pixmap = transparent_pixmap.scaled(
-                    label_size.width() - 20,
-                    label_size.height() - 20,
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                )
-
-                self.imageLabel.setPixmap(scaled_pixmap)
+            label_size = self.imageLabel.size()
+            width, height = label_size.width() - 20, label_size.height() - 20
+            alpha = self.current_alpha
+            image = self.original_image
+            key = (image.cacheKey(), alpha, (width, height))
+
+            # Альфа-канал и масштабирование - в фоне; серия движений ползунка или
+            # изменений размера окна дает одну отрисовку, а пока ее нет,
+            # растягивается прошлый кадр
+            self.show_placeholder(width, height)
+            self.render_scheduler.request(key, lambda: apply_opacity(image, alpha).scaled(
+                width,
+                height,
+                Qt.KeepAspectRatio,
+                Qt.SmoothTransformation
+            ))
 
         except Exception as e:
             self.show_error(f"Ошибка при обработке изображения: {str(e)}")
 
+    def frame_ready(self, key, image):
+        """Готов кадр из фонового потока"""
+        self.last_frame = QPixmap.fromImage(image)
+        self.imageLabel.setPixmap(self.last_frame)
+
+    def render_failed(self, error):
+        self.show_error(f"Ошибка при обработке изображения: {str(error)}")
+
+    def show_placeholder(self, width, height):
+        """Быстро растянутый прошлый кадр (или исходное изображение)"""
+        pixmap = self.last_frame if self.last_frame is not None else self.original_pixmap
+        self.imageLabel.setPixmap(pixmap.scaled(width, height, Qt.KeepAspectRatio, Qt.FastTransformation))
+
     def update_controls(self):
         """Обновление состояния элементов управления"""
         has_image = self.original_pixmap is not None
@@ -136,6 +140,11 @@ class AlphaImageEditor(QtWidgets.QMainWindow):
         super().resizeEvent(event)
         self.update_image_display()
 
+    def closeEvent(self, event):
+        """Обработчик закрытия окна"""
+        self.render_scheduler.shutdown()
+        event.accept()
+
 
 def main():
     app = QApplication(sys.argv)
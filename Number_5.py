@@ -1,9 +1,10 @@
 import sys
 import random
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QInputDialog, QFileDialog, QMessageBox, QApplication
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QPainter, QColor
+from ui_loader import load_ui
 
 
 class FlagGenerator(QtWidgets.QMainWindow):
@@ -11,7 +12,7 @@ class FlagGenerator(QtWidgets.QMainWindow):
         super().__init__()
 
         # Загрузка интерфейса из файла
-        uic.loadUi('flag_generator.ui', self)
+        load_ui('flag_generator.ui', self)
 
         # Инициализация переменных
         self.current_flag = None
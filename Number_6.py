@@ -1,9 +1,10 @@
 import sys
 import math
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QColorDialog, QApplication
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPainter, QColor, QPen, QBrush
+from ui_loader import load_ui
 
 
 class SmileyWidget(QtWidgets.QWidget):
@@ -83,7 +84,7 @@ class SmileyPainter(QtWidgets.QMainWindow):
         super().__init__()
 
         # Загрузка интерфейса из файла
-        uic.loadUi('smiley_painter.ui', self)
+        load_ui('smiley_painter.ui', self)
 
         # Инициализация переменных
         self.smiley_color = QColor(255, 255, 0)  # Желтый по умолчанию
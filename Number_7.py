@@ -1,10 +1,10 @@
 import sys
 import os
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QFileDialog, QMessageBox, QApplication
 from PyQt5.QtCore import Qt, QUrl, QTimer
-from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 from PyQt5.QtGui import QPainter, QColor, QPen, QBrush
+from ui_loader import load_ui
 import random
 
 
@@ -50,7 +50,7 @@ class PianoWidget(QtWidgets.QWidget):
         super().__init__(parent)
         self.keys = []
         self.sounds = {}
-        self.player = QMediaPlayer()
+        self.player = None
         self.init_ui()
 
     def init_ui(self):
@@ -83,14 +83,24 @@ class PianoWidget(QtWidgets.QWidget):
     def load_sounds(self, sound_files):
         """Загрузка звуковых файлов"""
         self.sounds = sound_files
-        self.player = QMediaPlayer()
+        if self.player is not None:
+            self.player.stop()
+        self.player = None
+
+    def media_player(self):
+        """Проигрыватель; QtMultimedia загружается долго, поэтому только при первой ноте"""
+        if self.player is None:
+            from PyQt5.QtMultimedia import QMediaPlayer
+            self.player = QMediaPlayer()
+        return self.player
 
     def play_note(self, note):
         """Проигрывание ноты"""
         if note in self.sounds:
-            media_content = QMediaContent(QUrl.fromLocalFile(self.sounds[note]))
-            self.player.setMedia(media_content)
-            self.player.play()
+            from PyQt5.QtMultimedia import QMediaContent
+            player = self.media_player()
+            player.setMedia(QMediaContent(QUrl.fromLocalFile(self.sounds[note])))
+            player.play()
 
     def play_notes_sequence(self, notes, delay=500):
         """Проигрывание последовательности нот"""
@@ -113,7 +123,8 @@ class PianoWidget(QtWidgets.QWidget):
         """Остановка проигрывания"""
         if hasattr(self, 'melody_timer') and self.melody_timer.isActive():
             self.melody_timer.stop()
-        self.player.stop()
+        if self.player is not None:
+            self.player.stop()
 
 
 class PianoApp(QtWidgets.QMainWindow):
@@ -121,7 +132,7 @@ class PianoApp(QtWidgets.QMainWindow):
         super().__init__()
 
         # Загрузка интерфейса из файла
-        uic.loadUi('piano.ui', self)
+        load_ui('piano.ui', self)
 
         # Инициализация переменных
         self.sounds_loaded = False
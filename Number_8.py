@@ -1,10 +1,11 @@
 import sys
 import os
 import math
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QFileDialog, QMessageBox, QApplication
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QPainter, QPen, QColor
+from ui_loader import load_ui
 
 
 class LSystem:
@@ -157,7 +158,7 @@ class LSystemViewer(QtWidgets.QMainWindow):
         super().__init__()
 
         # Загрузка интерфейса из файла
-        uic.loadUi('lsystem_viewer.ui', self)
+        load_ui('lsystem_viewer.ui', self)
 
         # Инициализация L-системы
         self.lsystem = LSystem()
@@ -0,0 +1,228 @@
+"""Замеры скорости разбора файлов с числами (Number_1) без графического интерфейса
+
+Генерирует синтетические входные файлы разных размеров и видов, замеряет
+каждый способ разбора и режим в отдельном процессе (время, МБ/с, пиковое
+потребление памяти) и сохраняет результаты в JSON для сравнения версий:
+
+    python benchmark_number_1.py --sizes 1,16,256 -o bench.json
+    python benchmark_number_1.py --sizes 1,16,256 -o bench_new.json --compare bench.json
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tempfile
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: пиковая память не измеряется
+
+import number_analysis
+from number_analysis import (
+    ENGINES, ENGINE_NUMPY, NUMPY_AVAILABLE, analyze_numbers, analyze_numbers_cached,
+    analyze_numbers_parallel, sidecar_path,
+)
+
+
+MB = 1024 * 1024
+
+# Размер блока, который повторяется при генерации входного файла
+PATTERN_SIZE = MB
+
+# Виды входных данных
+SHAPES = ('one_per_line', 'long_lines', 'junk_heavy', 'huge_ints')
+
+# Режимы анализа
+MODES = ('sequential', 'parallel', 'sidecar_cold', 'sidecar_warm')
+
+DEFAULT_SIZES = (1, 16, 128)
+
+
+def generate_pattern(shape, rng):
+    """Блок текста примерно PATTERN_SIZE байт, заканчивающийся переводом строки"""
+    parts = []
+    size = 0
+    while size < PATTERN_SIZE:
+        if shape == 'one_per_line':
+            line = f"{rng.randint(-10 ** 9, 10 ** 9)}\n"
+        elif shape == 'long_lines':
+            line = " ".join(str(rng.randint(-10 ** 9, 10 ** 9)) for _ in range(1000)) + "\n"
+        elif shape == 'junk_heavy':
+            tokens = [
+                str(rng.randint(-10 ** 6, 10 ** 6)) if rng.random() < 0.5
+                else rng.choice(("abc", "1.5", "n/a", "12x", "--", "значение"))
+                for _ in range(20)
+            ]
+            line = " ".join(tokens) + "\n"
+        else:
+            line = " ".join(str(rng.randint(10 ** 29, 10 ** 30)) for _ in range(10)) + "\n"
+        parts.append(line)
+        size += len(line.encode('utf-8'))
+    return "".join(parts).encode('utf-8')
+
+
+def ensure_input(data_dir, shape, size_mb, seed=0):
+    """Создание входного файла (повторно используется, если уже есть)"""
+    path = os.path.join(data_dir, f"{shape}_{size_mb}mb.txt")
+    target = size_mb * MB
+    if os.path.exists(path) and os.path.getsize(path) >= target:
+        return path
+
+    pattern = generate_pattern(shape, random.Random(seed))
+    written = 0
+    with open(path, 'wb') as file:
+        while written < target:
+            file.write(pattern)
+            written += len(pattern)
+    return path
+
+
+def peak_rss_mb(who):
+    """Пиковый объем резидентной памяти в МБ (None, если недоступно)"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux сообщает килобайты, macOS - байты
+    return rss / MB if sys.platform == 'darwin' else rss / 1024
+
+
+def measure(path, engine, mode):
+    """Один замер в текущем процессе: словарь с временем и результатом"""
+    if mode == 'sidecar_cold' and os.path.exists(sidecar_path(path)):
+        os.remove(sidecar_path(path))
+
+    start = time.perf_counter()
+    if mode == 'sequential':
+        stats = analyze_numbers(path, engine=engine)
+    elif mode == 'parallel':
+        stats = analyze_numbers_parallel(path, engine=engine)
+    else:
+        stats = analyze_numbers_cached(path, engine=engine)
+    seconds = time.perf_counter() - start
+
+    return {
+        'seconds': seconds,
+        'count': stats.count,
+        'total': stats.total,
+        'min': stats.min_value,
+        'max': stats.max_value,
+        'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'peak_child_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+    }
+
+
+def measure_in_subprocess(path, engine, mode):
+    """Замер в отдельном процессе, чтобы пиковая память относилась только к нему"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure', path, engine, mode],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def run_benchmarks(sizes, shapes, engines, modes, data_dir):
+    results = []
+    for size_mb in sizes:
+        for shape in shapes:
+            path = ensure_input(data_dir, shape, size_mb)
+            file_mb = os.path.getsize(path) / MB
+            reference = None
+            for engine in engines:
+                for mode in modes:
+                    result = measure_in_subprocess(path, engine, mode)
+                    result.update(shape=shape, size_mb=size_mb, engine=engine, mode=mode,
+                                  mb_per_s=file_mb / result['seconds'] if result['seconds'] else None)
+
+                    # Все способы и режимы обязаны давать одинаковый результат
+                    summary = (result['count'], result['total'], result['min'], result['max'])
+                    if reference is None:
+                        reference = summary
+                    result['matches_reference'] = summary == reference
+
+                    results.append(result)
+                    print(f"{shape:>12} {size_mb:>6} МБ {engine:>6} {mode:>12}: "
+                          f"{result['mb_per_s']:8.1f} МБ/с, память {result['peak_rss_mb'] or 0:7.1f} МБ"
+                          f"{'' if result['matches_reference'] else '  РЕЗУЛЬТАТ РАСХОДИТСЯ'}",
+                          file=sys.stderr)
+            if os.path.exists(sidecar_path(path)):
+                os.remove(sidecar_path(path))
+    return results
+
+
+def compare(results, baseline_path):
+    """Вывод изменения скорости относительно результатов прошлой версии"""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    def key(result):
+        return result['shape'], result['size_mb'], result['engine'], result['mode']
+
+    old = {key(result): result for result in baseline['results']}
+    for result in results:
+        previous = old.get(key(result))
+        if previous and previous['mb_per_s'] and result['mb_per_s']:
+            ratio = result['mb_per_s'] / previous['mb_per_s']
+            print(f"{' '.join(map(str, key(result)))}: {previous['mb_per_s']:.1f} -> "
+                  f"{result['mb_per_s']:.1f} МБ/с (x{ratio:.2f})")
+
+
+def parse_list(value, choices=None):
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    if choices is not None:
+        unknown = set(items) - set(choices)
+        if unknown:
+            raise argparse.ArgumentTypeError(f"неизвестные значения: {', '.join(sorted(unknown))}")
+    return items
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ['--measure']:
+        print(json.dumps(measure(*argv[1:4])))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Замеры скорости разбора файлов с числами")
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in parse_list(value)],
+                        default=list(DEFAULT_SIZES), help="размеры входных файлов в МБ (1-4096)")
+    parser.add_argument('--shapes', type=lambda value: parse_list(value, SHAPES),
+                        default=list(SHAPES), help=f"виды данных: {', '.join(SHAPES)}")
+    parser.add_argument('--engines', type=lambda value: parse_list(value, ENGINES),
+                        default=[engine for engine in ENGINES
+                                 if engine != ENGINE_NUMPY or NUMPY_AVAILABLE],
+                        help="способы разбора")
+    parser.add_argument('--modes', type=lambda value: parse_list(value, MODES),
+                        default=list(MODES), help=f"режимы: {', '.join(MODES)}")
+    parser.add_argument('--data-dir', help="каталог для входных файлов (по умолчанию - временный)")
+    parser.add_argument('-o', '--output', default='bench_number_1.json', help="файл с результатами")
+    parser.add_argument('--compare', help="JSON с результатами прошлой версии")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or os.path.join(tempfile.gettempdir(), 'number_1_bench')
+    os.makedirs(data_dir, exist_ok=True)
+
+    results = run_benchmarks(args.sizes, args.shapes, args.engines, args.modes, data_dir)
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': number_analysis.np.__version__ if NUMPY_AVAILABLE else None,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0 if all(result['matches_reference'] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Замеры времени запуска всех восьми программ
+
+Каждый запуск идет в отдельном процессе: импорт модуля программы, создание
+QApplication и главного окна, показ окна и обработка первых событий.
+Сравниваются загрузка интерфейса через uic и из скомпилированного кэша
+(ui_loader.py), результаты сохраняются в JSON:
+
+    python ui_loader.py
+    python benchmark_startup.py --repeat 5 -o bench_startup.json
+    python benchmark_startup.py -o bench_new.json --compare bench_startup.json
+
+Без дисплея можно запускать с QT_QPA_PLATFORM=offscreen.
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import subprocess
+import statistics
+
+import ui_loader
+
+
+# Программа: (модуль, класс главного окна, .ui-файл)
+TOOLS = {
+    'Number_1': ('NumberAnalyzer', 'designer.ui'),
+    'Number_2': ('TextEditor', 'text_editor.ui'),
+    'Number_3': ('ImageEditor', 'image_editor.ui'),
+    'Number_4': ('AlphaImageEditor', 'alpha_editor.ui'),
+    'Number_5': ('FlagGenerator', 'flag_generator.ui'),
+    'Number_6': ('SmileyPainter', 'smiley_painter.ui'),
+    'Number_7': ('PianoApp', 'piano.ui'),
+    'Number_8': ('LSystemViewer', 'lsystem_viewer.ui'),
+}
+
+# Способы загрузки интерфейса
+MODES = ('uic', 'cached')
+
+
+def measure(tool, mode):
+    """Один запуск в текущем процессе: словарь с временем этапов"""
+    start = time.perf_counter()
+    ui_loader.USE_CACHE = mode == 'cached'
+
+    from PyQt5.QtWidgets import QApplication
+    qt_loaded = time.perf_counter()
+
+    module = __import__(tool)
+    imported = time.perf_counter()
+
+    app = QApplication([sys.argv[0]])
+    app.setStyle('Fusion')
+    created_app = time.perf_counter()
+
+    window = getattr(module, TOOLS[tool][0])()
+    created_window = time.perf_counter()
+
+    window.show()
+    app.processEvents()
+    shown = time.perf_counter()
+
+    result = {
+        'qt_import_seconds': qt_loaded - start,
+        'import_seconds': imported - qt_loaded,
+        'app_seconds': created_app - imported,
+        'window_seconds': created_window - created_app,
+        'show_seconds': shown - created_window,
+        'total_seconds': shown - start,
+        'modules': len(sys.modules),
+    }
+    window.close()
+    return result
+
+
+def measure_in_subprocess(tool, mode):
+    """Запуск в новом процессе, чтобы ничего не было импортировано заранее"""
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure', tool, mode],
+        check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_benchmarks(tools, modes, repeat):
+    results = []
+    for tool in tools:
+        ui_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), TOOLS[tool][1])
+        cache_fresh = ui_loader.is_fresh(ui_file)
+        for mode in modes:
+            runs = [measure_in_subprocess(tool, mode) for _ in range(repeat)]
+            # Медиана по каждому показателю сглаживает случайные выбросы
+            result = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            result.update(tool=tool, mode=mode, repeat=repeat,
+                          cache_used=mode == 'cached' and cache_fresh)
+            results.append(result)
+            print(f"{tool:>9} {mode:>6}: окно {result['window_seconds'] * 1000:7.1f} мс, "
+                  f"импорт {result['import_seconds'] * 1000:7.1f} мс, "
+                  f"процесс {result['process_seconds'] * 1000:7.1f} мс"
+                  f"{'' if mode != 'cached' or cache_fresh else '  КЭШ НЕ СОБРАН'}",
+                  file=sys.stderr)
+    return results
+
+
+def print_gain(results):
+    """Выигрыш кэша относительно uic для каждой программы"""
+    by_key = {(result['tool'], result['mode']): result for result in results}
+    for tool in TOOLS:
+        old, new = by_key.get((tool, 'uic')), by_key.get((tool, 'cached'))
+        if old and new and new['total_seconds']:
+            print(f"{tool}: {old['total_seconds'] * 1000:.1f} -> "
+                  f"{new['total_seconds'] * 1000:.1f} мс (x{old['total_seconds'] / new['total_seconds']:.2f})")
+
+
+def compare(results, baseline_path):
+    """Вывод изменения времени запуска относительно результатов прошлой версии"""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    old = {(result['tool'], result['mode']): result for result in baseline['results']}
+    for result in results:
+        previous = old.get((result['tool'], result['mode']))
+        if previous and result['total_seconds']:
+            ratio = previous['total_seconds'] / result['total_seconds']
+            print(f"{result['tool']} {result['mode']}: {previous['total_seconds'] * 1000:.1f} -> "
+                  f"{result['total_seconds'] * 1000:.1f} мс (x{ratio:.2f})")
+
+
+def parse_list(value, choices):
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = set(items) - set(choices)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"неизвестные значения: {', '.join(sorted(unknown))}")
+    return items
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ['--measure']:
+        print(json.dumps(measure(*argv[1:3])))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Замеры времени запуска программ")
+    parser.add_argument('--tools', type=lambda value: parse_list(value, TOOLS),
+                        default=list(TOOLS), help=f"программы: {', '.join(TOOLS)}")
+    parser.add_argument('--modes', type=lambda value: parse_list(value, MODES),
+                        default=list(MODES), help=f"загрузка интерфейса: {', '.join(MODES)}")
+    parser.add_argument('--repeat', type=int, default=5, help="запусков на каждый замер")
+    parser.add_argument('-o', '--output', default='bench_startup.json', help="файл с результатами")
+    parser.add_argument('--compare', help="JSON с результатами прошлой версии")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.tools, args.modes, max(1, args.repeat))
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'qt_platform': os.environ.get('QT_QPA_PLATFORM'),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+    print_gain(results)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
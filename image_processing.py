@@ -0,0 +1,858 @@
+"""Обработка изображений без GUI: фильтры каналов, повороты, конвейер фильтров, пирамида, кэш кадров
+
+Изображение переводится в Format_ARGB32, где каждый пиксель - 32-битное
+число 0xAARRGGBB, и фильтр работает сразу со всей памятью изображения
+(bits()): через NumPy без копирования или, если NumPy нет, срезами байтов.
+Результат совпадает с прежней обработкой по пикселям через QColor, включая
+округление цвета у изображений с premultiplied alpha.
+
+Те же операции доступны для целых каталогов из командной строки:
+
+    python image_processing.py photos out --ops grayscale,right --format png
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from PyQt5.QtCore import Qt, QRect, QSize
+from PyQt5.QtGui import QImage, QImageReader, QImageWriter, QPainter, QPixelFormat, QTransform
+
+from lazy_import import lazy_import
+
+# numpy загружается при первом использовании, а не при запуске
+np = lazy_import('numpy')
+
+NUMPY_AVAILABLE = np is not None
+
+
+# Режимы отображения цветовых каналов
+CHANNEL_ORIGINAL = 'original'
+CHANNEL_RED = 'red'
+CHANNEL_GREEN = 'green'
+CHANNEL_BLUE = 'blue'
+CHANNEL_GRAYSCALE = 'grayscale'
+CHANNELS = (CHANNEL_ORIGINAL, CHANNEL_RED, CHANNEL_GREEN, CHANNEL_BLUE, CHANNEL_GRAYSCALE)
+
+# Повороты редактора изображений: операция -> угол
+ROTATIONS = {'left': -90, 'right': 90, 'flip': 180}
+
+# Обрезка до квадрата, как при открытии изображения в редакторе
+OPERATION_SQUARE = 'square'
+
+# Операции пакетной обработки
+OPERATIONS = CHANNELS[1:] + tuple(ROTATIONS) + (OPERATION_SQUARE,)
+
+# Маски пикселя ARGB32
+ALPHA_MASK = 0xFF000000
+CHANNEL_MASKS = {
+    CHANNEL_RED: 0x00FF0000,
+    CHANNEL_GREEN: 0x0000FF00,
+    CHANNEL_BLUE: 0x000000FF,
+}
+
+# Смещения байтов A, R, G, B внутри пикселя в памяти (зависят от порядка байтов)
+if sys.byteorder == 'little':
+    ALPHA_BYTE, RED_BYTE, GREEN_BYTE, BLUE_BYTE = 3, 2, 1, 0
+else:
+    ALPHA_BYTE, RED_BYTE, GREEN_BYTE, BLUE_BYTE = 0, 1, 2, 3
+
+# Сколько пикселей обрабатывается за проход, когда нужны временные массивы
+# (оттенки серого, premultiplied alpha)
+BLOCK_PIXELS = 1024 * 1024
+
+# Сторона квадратной плитки при обработке больших изображений (в пикселях)
+TILE_SIZE = 512
+
+# Изображения меньше этого числа пикселей обрабатываются целиком, без плиток
+TILED_MIN_PIXELS = 4 * 1024 * 1024
+
+# Память под кэш обработанных кадров по умолчанию (в байтах)
+FRAME_CACHE_BUDGET = 256 * 1024 * 1024
+
+# Пирамида уменьшенных копий строится, пока большая сторона не станет меньше
+PYRAMID_MIN_SIZE = 256
+
+# Большая сторона изображения при быстром открытии (полное разрешение
+# декодируется только при сохранении)
+PREVIEW_SIZE = 2048
+
+# Манифест каталога результатов: какими операциями и в каком формате
+# получен каждый результат (пакетная обработка)
+MANIFEST_FILE = '.image_processing.json'
+
+
+def gray_value(r, g, b):
+    """Яркость пикселя - та же формула, что и при обработке через QColor"""
+    return int(0.299 * r + 0.587 * g + 0.114 * b)
+
+
+def unpremultiply_value(value, alpha):
+    """Компонента цвета без premultiplied alpha, как ее возвращает QImage.pixelColor
+
+    pixelColor делит в 16-битной точности (QRgba64.unpremultiplied) и
+    округляет до 8 бит как QColor.red(); convertToFormat округляет иначе.
+    """
+    if alpha in (0, 255):
+        return value
+    alpha16 = alpha * 257
+    factor = (0xFFFF00008000 + alpha16 // 2) // alpha16
+    value16 = ((value * 257 * factor + 0x80000000) >> 32) & 0xFFFF
+    return (value16 + 0x80 - ((value16 + 0x80) >> 8)) >> 8
+
+
+@lru_cache(maxsize=None)
+def unpremultiply_table():
+    """unpremultiply_value для всех пар: байт с индексом (alpha << 8) | value"""
+    return bytes(unpremultiply_value(value, alpha) for alpha in range(256) for value in range(256))
+
+
+def is_premultiplied(image):
+    return (image.hasAlphaChannel()
+            and image.pixelFormat().premultiplied() == QPixelFormat.Premultiplied)
+
+
+def image_buffer(image):
+    """Память изображения (sip.voidptr) для записи; QImage отделяется от копий"""
+    pointer = image.bits()
+    pointer.setsize(image.bytesPerLine() * image.height())
+    return pointer
+
+
+def pixel_array(image, writable=True):
+    """Пиксели изображения ARGB32 как массив uint32 (высота, ширина) без копирования
+
+    Массив ссылается на память image и годен, пока image жив и не изменен.
+    Массив только для чтения (writable=False) не отделяет image от копий,
+    с которыми он делит память.
+    """
+    if writable:
+        buffer = image_buffer(image)
+    else:
+        buffer = image.constBits()
+        buffer.setsize(image.bytesPerLine() * image.height())
+    pixels = np.frombuffer(buffer, dtype=np.uint32)
+    return pixels.reshape(image.height(), image.bytesPerLine() // 4)[:, :image.width()]
+
+
+def filter_pixels(pixels, channel, premultiplied):
+    """Фильтр канала над массивом пикселей ARGB32 на месте (NumPy; годится и для плитки)"""
+    if channel in CHANNEL_MASKS and not premultiplied:
+        np.bitwise_and(pixels, CHANNEL_MASKS[channel], out=pixels)
+        np.bitwise_or(pixels, ALPHA_MASK, out=pixels)
+        return
+
+    # По блокам строк, чтобы временные массивы не росли с изображением
+    rows = max(1, BLOCK_PIXELS // max(1, pixels.shape[1]))
+    for top in range(0, pixels.shape[0], rows):
+        block = pixels[top:top + rows]
+        r = (block >> 16) & 0xFF
+        g = (block >> 8) & 0xFF
+        b = block & 0xFF
+        if premultiplied:
+            table = np.frombuffer(unpremultiply_table(), dtype=np.uint8)
+            alpha = (block >> 24) << 8
+            r, g, b = (table[alpha | values].astype(np.uint32) for values in (r, g, b))
+
+        if channel == CHANNEL_RED:
+            block[...] = ALPHA_MASK | (r << 16)
+        elif channel == CHANNEL_GREEN:
+            block[...] = ALPHA_MASK | (g << 8)
+        elif channel == CHANNEL_BLUE:
+            block[...] = ALPHA_MASK | b
+        else:
+            # Те же операции с float64 в том же порядке, что и в gray_value,
+            # поэтому результат совпадает до единицы
+            gray = (0.299 * r.astype(np.float64) + 0.587 * g.astype(np.float64)
+                    + 0.114 * b.astype(np.float64)).astype(np.uint32)
+            block[...] = ALPHA_MASK | (gray << 16) | (gray << 8) | gray
+
+
+def tile_rects(width, height, tile_size=TILE_SIZE):
+    """Плитки (x, y, ширина, высота), покрывающие изображение, построчно"""
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            yield x, y, min(tile_size, width - x), min(tile_size, height - y)
+
+
+def run_tiles(width, height, process_tile, workers=None):
+    """process_tile((x, y, ширина, высота)) для всех плиток изображения
+
+    Большое изображение обрабатывается пулом потоков. NumPy отпускает GIL на
+    операциях с массивами, поэтому плитки идут параллельно на всех ядрах, а
+    временные массивы есть только у плиток в работе: дополнительная память -
+    не больше workers плиток при любом размере изображения.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or width * height < TILED_MIN_PIXELS:
+        for rect in tile_rects(width, height):
+            process_tile(rect)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Задачи - только координаты: плитка - окно в память изображения,
+        # а не копия, поэтому очередь задач памяти не занимает
+        for _ in pool.map(process_tile, tile_rects(width, height)):
+            pass
+
+
+def apply_channel_numpy(image, channel, premultiplied, workers=None):
+    """Фильтр канала над изображением ARGB32 на месте (NumPy, по плиткам)"""
+    pixels = pixel_array(image)
+
+    def process_tile(rect):
+        x, y, width, height = rect
+        filter_pixels(pixels[y:y + height, x:x + width], channel, premultiplied)
+
+    run_tiles(image.width(), image.height(), process_tile, workers)
+
+
+def apply_channel_python(image, channel, premultiplied):
+    """Фильтр канала над изображением ARGB32 на месте (срезы байтов, без NumPy)"""
+    # У ARGB32 строки без выравнивания, поэтому пиксели идут подряд
+    data = memoryview(image_buffer(image)).cast('B')
+    count = image.width() * image.height()
+
+    components = {}
+    for offset in (RED_BYTE, GREEN_BYTE, BLUE_BYTE):
+        if premultiplied:
+            table = unpremultiply_table()
+            components[offset] = bytes(table[(alpha << 8) | value]
+                                       for value, alpha in zip(data[offset::4], data[ALPHA_BYTE::4]))
+        else:
+            components[offset] = data[offset::4]
+    data[ALPHA_BYTE::4] = b'\xff' * count
+
+    if channel in CHANNEL_MASKS:
+        kept = {CHANNEL_RED: RED_BYTE, CHANNEL_GREEN: GREEN_BYTE, CHANNEL_BLUE: BLUE_BYTE}[channel]
+        for offset in (RED_BYTE, GREEN_BYTE, BLUE_BYTE):
+            data[offset::4] = components[offset] if offset == kept else bytes(count)
+        return
+
+    gray = bytes(map(gray_value, components[RED_BYTE], components[GREEN_BYTE], components[BLUE_BYTE]))
+    for offset in (RED_BYTE, GREEN_BYTE, BLUE_BYTE):
+        data[offset::4] = gray
+
+
+def apply_channel(image, channel, workers=None):
+    """Новое изображение с выбранным цветовым каналом (исходное не меняется)
+
+    Для CHANNEL_ORIGINAL возвращается само image. Остальные режимы дают
+    непрозрачное изображение Format_ARGB32. workers - число потоков для
+    больших изображений (по умолчанию - по числу ядер).
+    """
+    if channel == CHANNEL_ORIGINAL or image.isNull():
+        return image
+    if channel not in CHANNELS:
+        raise ValueError(f"Неизвестный режим канала: {channel}")
+
+    # convertToFormat в тот же формат возвращает разделяемую копию, а bits()
+    # отделяет ее от исходного изображения перед записью
+    premultiplied = is_premultiplied(image)
+    result = image.convertToFormat(QImage.Format_ARGB32_Premultiplied if premultiplied
+                                   else QImage.Format_ARGB32)
+    if NUMPY_AVAILABLE:
+        apply_channel_numpy(result, channel, premultiplied, workers)
+    else:
+        apply_channel_python(result, channel, premultiplied)
+
+    # Все пиксели теперь непрозрачны, а для них оба формата совпадают
+    result.reinterpretAsFormat(QImage.Format_ARGB32)
+    return result
+
+
+def rotate_lossless(frame, angle):
+    """Поворот QImage или QPixmap на угол, кратный 90°, без интерполяции
+
+    Такой поворот только переставляет пиксели, поэтому он перестановочен с
+    фильтрами каналов и не размывает изображение.
+    """
+    if angle % 90:
+        raise ValueError(f"Угол должен быть кратен 90°: {angle}")
+    if angle % 360 == 0:
+        return frame
+    return frame.transformed(QTransform().rotate(angle), Qt.FastTransformation)
+
+
+def read_square_image(file_path, max_side=None):
+    """Квадрат из левого верхнего угла файла изображения, при max_side - уменьшенный
+
+    Размер берется из заголовка файла, а обрезка (setClipRect) и уменьшение
+    (setScaledSize) выполняются при декодировании: JPEG сразу декодируется
+    в уменьшенном масштабе, и полное разрешение в память не попадает.
+    Возвращает (QImage, сторона квадрата в полном разрешении, была ли
+    обрезка); при ошибке чтения изображение пустое (isNull).
+    """
+    reader = QImageReader(file_path)
+    size = reader.size()
+    if not size.isValid():
+        # Формат не сообщает размер заранее: декодирование целиком
+        image = reader.read()
+        side = min(image.width(), image.height())
+        cropped = image.width() != image.height()
+        image = crop_square(image)
+        if max_side and side > max_side:
+            image = image.scaled(max_side, max_side, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        return image, side, cropped
+
+    side = min(size.width(), size.height())
+    cropped = size.width() != size.height()
+    if cropped:
+        reader.setClipRect(QRect(0, 0, side, side))
+    if max_side and side > max_side:
+        reader.setScaledSize(QSize(max_side, max_side))
+    return reader.read(), side, cropped
+
+
+def crop_square(image):
+    """Квадрат из левого верхнего угла со стороной по меньшей стороне изображения"""
+    if image.width() == image.height():
+        return image
+    size = min(image.width(), image.height())
+    return image.copy(0, 0, size, size)
+
+
+def operation_node(operation):
+    """Узел конвейера фильтров для операции из OPERATIONS"""
+    if operation in CHANNELS:
+        return ChannelFilter(operation)
+    if operation in ROTATIONS:
+        return Rotate(ROTATIONS[operation])
+    if operation == OPERATION_SQUARE:
+        return CropSquare()
+    raise ValueError(f"Неизвестная операция: {operation}")
+
+
+def apply_operations(image, operations, workers=None):
+    """Операции по порядку, как их применил бы редактор изображений
+
+    Возвращает результат и статистику этапов (FilterPipeline.stats).
+    """
+    pipeline = FilterPipeline([operation_node(operation) for operation in operations])
+    return pipeline.run(image, workers), pipeline.stats
+
+
+def render_preview(level, channel, angle, width, height, processed=None):
+    """Кадр для показа: (уровень с фильтром канала, кадр с поворотом, вписанный в width x height)
+
+    processed - уже готовый результат фильтра для level, если он есть: он
+    один на все повороты. Работает только с QImage, поэтому годится для
+    фонового потока.
+    """
+    if processed is None:
+        processed = FilterPipeline([ChannelFilter(channel)]).run(level)
+    frame = FilterPipeline([Rotate(angle), Scale(width, height)]).run(processed)
+    return processed, frame
+
+
+def apply_opacity(image, percent):
+    """Новое изображение с общей непрозрачностью percent (0-100)"""
+    result = QImage(image.size(), QImage.Format_ARGB32_Premultiplied)
+    result.fill(Qt.transparent)
+    painter = QPainter(result)
+    painter.setOpacity(percent / 100.0)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    return result
+
+
+def frame_cost(frame):
+    """Память, занимаемая QImage или QPixmap (в байтах)"""
+    return frame.width() * frame.height() * max(frame.depth(), 8) // 8
+
+
+class FilterNode:
+    """Узел конвейера фильтров (FilterPipeline)
+
+    apply_image(image, workers) - операция над QImage целиком: так узел
+    выполняется без NumPy и когда его нельзя слить с соседями.
+    """
+    name = 'node'
+
+    def is_identity(self):
+        """Узел ничего не меняет и в конвейер не попадает"""
+        return False
+
+    def apply_image(self, image, workers=None):
+        raise NotImplementedError
+
+
+class PixelNode(FilterNode):
+    """Поканальный фильтр: пиксель результата зависит только от того же пикселя
+
+    Подряд идущие такие узлы выполняются за один проход по памяти.
+    apply_pixels меняет плитку пикселей ARGB32 (массив uint32) на месте.
+    """
+
+    def apply_pixels(self, pixels, premultiplied):
+        raise NotImplementedError
+
+    def output_premultiplied(self, premultiplied):
+        """Остаются ли пиксели premultiplied после фильтра"""
+        return premultiplied
+
+
+class GeometryNode(FilterNode):
+    """Перестановка пикселей (поворот, обрезка)
+
+    Сводится к отображению индексов: map_pixels возвращает представление
+    массива пикселей без копирования. Такие узлы перестановочны с
+    поканальными фильтрами и сливаются с ними в один проход.
+    """
+
+    def map_pixels(self, pixels):
+        raise NotImplementedError
+
+
+class ChannelFilter(PixelNode):
+    """Выбор цветового канала или оттенки серого (apply_channel)"""
+
+    def __init__(self, channel):
+        if channel not in CHANNELS:
+            raise ValueError(f"Неизвестный режим канала: {channel}")
+        self.channel = channel
+        self.name = channel
+
+    def is_identity(self):
+        return self.channel == CHANNEL_ORIGINAL
+
+    def apply_image(self, image, workers=None):
+        return apply_channel(image, self.channel, workers)
+
+    def apply_pixels(self, pixels, premultiplied):
+        filter_pixels(pixels, self.channel, premultiplied)
+
+    def output_premultiplied(self, premultiplied):
+        # Результат непрозрачен, а непрозрачные пиксели одинаковы в обоих форматах
+        return False
+
+
+class Rotate(GeometryNode):
+    """Поворот на угол, кратный 90° (rotate_lossless)"""
+
+    def __init__(self, angle):
+        if angle % 90:
+            raise ValueError(f"Угол должен быть кратен 90°: {angle}")
+        self.angle = angle % 360
+        self.name = f'rotate{self.angle}'
+
+    def is_identity(self):
+        return self.angle == 0
+
+    def apply_image(self, image, workers=None):
+        return rotate_lossless(image, self.angle)
+
+    def map_pixels(self, pixels):
+        # Ось y изображения направлена вниз, поэтому поворот по часовой
+        # стрелке - это np.rot90 в обратную сторону
+        return np.rot90(pixels, -self.angle // 90)
+
+
+class CropSquare(GeometryNode):
+    """Обрезка до квадрата (crop_square)"""
+    name = 'square'
+
+    def apply_image(self, image, workers=None):
+        return crop_square(image)
+
+    def map_pixels(self, pixels):
+        size = min(pixels.shape)
+        return pixels[:size, :size]
+
+
+class Scale(FilterNode):
+    """Вписывание в width x height с сохранением пропорций (QImage.scaled)
+
+    Интерполяция смешивает соседние пиксели, поэтому масштабирование - отдельный этап.
+    """
+
+    def __init__(self, width, height, mode=Qt.SmoothTransformation):
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.name = f'scale{width}x{height}'
+
+    def apply_image(self, image, workers=None):
+        return image.scaled(self.width, self.height, Qt.KeepAspectRatio, self.mode)
+
+
+class FilterPipeline:
+    """Цепочка узлов фильтров с объединением в один проход
+
+    Подряд идущие повороты, обрезки и поканальные фильтры образуют один этап:
+    повороты и обрезки сводятся к отображению индексов (представление массива
+    без копирования), а фильтры выполняются над каждой плиткой результата
+    сразу после ее копирования. Этап создает одно новое изображение вместо
+    одного на каждую операцию. Остальные узлы (Scale) - отдельные этапы.
+
+    После run в stats - список этапов: {'stage', 'seconds', 'bytes'}, где
+    bytes - память созданных этапом изображений (плитки в работе не считаются).
+    """
+
+    def __init__(self, nodes):
+        self.nodes = [node for node in nodes if not node.is_identity()]
+        self.stats = []
+
+    @staticmethod
+    def is_fusable(node):
+        return NUMPY_AVAILABLE and isinstance(node, (PixelNode, GeometryNode))
+
+    def stages(self):
+        """Узлы, сгруппированные в этапы (список списков)"""
+        stages = []
+        for node in self.nodes:
+            if self.is_fusable(node) and stages and self.is_fusable(stages[-1][-1]):
+                stages[-1].append(node)
+            else:
+                stages.append([node])
+        return stages
+
+    def run(self, image, workers=None):
+        """Результат цепочки для QImage; исходное изображение не меняется"""
+        self.stats = []
+        if image.isNull():
+            return image
+        for nodes in self.stages():
+            start = time.perf_counter()
+            if self.is_fusable(nodes[0]):
+                result, allocated = self.run_fused(image, nodes, workers)
+            else:
+                result = nodes[0].apply_image(image, workers)
+                allocated = 0 if result is image else frame_cost(result)
+            self.stats.append({
+                'stage': '+'.join(node.name for node in nodes),
+                'seconds': time.perf_counter() - start,
+                'bytes': allocated,
+            })
+            image = result
+        return image
+
+    def run_fused(self, image, nodes, workers=None):
+        """Один проход по памяти для поворотов, обрезок и поканальных фильтров"""
+        premultiplied = is_premultiplied(image)
+        pixel_format = QImage.Format_ARGB32_Premultiplied if premultiplied else QImage.Format_ARGB32
+        allocated = 0
+        if image.format() != pixel_format:
+            image = image.convertToFormat(pixel_format)
+            allocated += frame_cost(image)
+
+        # Повороты и обрезки в порядке объявления, фильтры - в своем порядке:
+        # перестановка пикселей не меняет их значений
+        source = pixel_array(image, writable=False)
+        for node in nodes:
+            if isinstance(node, GeometryNode):
+                source = node.map_pixels(source)
+        filters = [node for node in nodes if isinstance(node, PixelNode)]
+
+        height, width = source.shape
+        result = QImage(width, height, pixel_format)
+        allocated += frame_cost(result)
+        target = pixel_array(result)
+
+        def process_tile(rect):
+            x, y, tile_width, tile_height = rect
+            tile = target[y:y + tile_height, x:x + tile_width]
+            np.copyto(tile, source[y:y + tile_height, x:x + tile_width])
+            tile_premultiplied = premultiplied
+            for node in filters:
+                node.apply_pixels(tile, tile_premultiplied)
+                tile_premultiplied = node.output_premultiplied(tile_premultiplied)
+
+        run_tiles(width, height, process_tile, workers)
+
+        for node in filters:
+            premultiplied = node.output_premultiplied(premultiplied)
+        if pixel_format == QImage.Format_ARGB32_Premultiplied and not premultiplied:
+            result.reinterpretAsFormat(QImage.Format_ARGB32)
+        return result, allocated
+
+    def report(self):
+        """Статистика последнего запуска текстом, по этапу в строке"""
+        return format_stats(self.stats)
+
+
+def format_stats(stats):
+    return '\n'.join(f"{entry['stage']}: {entry['seconds'] * 1000:.1f} мс, "
+                     f"{entry['bytes'] / (1024 * 1024):.1f} МБ" for entry in stats)
+
+
+def merge_stats(total, stats):
+    """Сложение статистики этапов stats в total (словарь по имени этапа)"""
+    for entry in stats:
+        summary = total.setdefault(entry['stage'], {'stage': entry['stage'], 'seconds': 0.0, 'bytes': 0})
+        summary['seconds'] += entry['seconds']
+        summary['bytes'] += entry['bytes']
+    return total
+
+
+class FrameCache:
+    """LRU-кэш обработанных кадров с ограничением по памяти
+
+    Ключ - произвольный кортеж (например, идентификатор изображения, поворот,
+    канал и размер). При переполнении удаляются давно не использованные кадры.
+    """
+
+    def __init__(self, budget=FRAME_CACHE_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Кадр по ключу или None"""
+        frame = self.entries.get(key)
+        if frame is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        """Добавление кадра; слишком большой для бюджета кадр не хранится"""
+        self.remove(key)
+        cost = frame_cost(frame)
+        if cost > self.budget:
+            return frame
+        self.entries[key] = frame
+        self.used += cost
+        while self.used > self.budget:
+            _, oldest = self.entries.popitem(last=False)
+            self.used -= frame_cost(oldest)
+        return frame
+
+    def remove(self, key):
+        frame = self.entries.pop(key, None)
+        if frame is not None:
+            self.used -= frame_cost(frame)
+
+    def clear(self):
+        self.entries.clear()
+        self.used = 0
+
+
+class MipPyramid:
+    """Уменьшенные копии изображения, каждая вдвое меньше предыдущей
+
+    Уровень 0 - исходное изображение. Для показа в окне берется наименьший
+    уровень, который не придется увеличивать, поэтому обработка для экрана
+    зависит от размера окна, а не от размера изображения.
+    """
+
+    def __init__(self, image):
+        self.levels = [image]
+        while max(image.width(), image.height()) // 2 >= PYRAMID_MIN_SIZE:
+            image = image.scaled(max(1, image.width() // 2), max(1, image.height() // 2),
+                                 Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            self.levels.append(image)
+
+    @property
+    def full(self):
+        return self.levels[0]
+
+    def level_for(self, width, height):
+        """Наименьший уровень, который вписывается в width x height без увеличения"""
+        full = self.full
+        scale = min(width / full.width(), height / full.height())
+        for level in reversed(self.levels):
+            if level.width() >= full.width() * scale and level.height() >= full.height() * scale:
+                return level
+        return full
+
+
+def list_images(input_dir):
+    """Изображения в каталоге и подкаталогах: относительные пути по порядку"""
+    extensions = {'.' + bytes(name).decode('ascii').lower()
+                  for name in QImageReader.supportedImageFormats()}
+    paths = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                paths.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return paths
+
+
+def output_path(output_dir, relative_path, output_format=None):
+    """Путь результата: тот же относительный путь, расширение - по output_format"""
+    path = os.path.join(output_dir, relative_path)
+    if output_format:
+        path = os.path.splitext(path)[0] + '.' + output_format
+    return path
+
+
+def output_stamp(operations, target):
+    """Отметка результата в манифесте: операции и формат файла"""
+    return {'ops': list(operations), 'format': os.path.splitext(target)[1][1:].lower()}
+
+
+def is_up_to_date(source, target, stamp, recorded):
+    """Результат получен с той же отметкой, существует и не старше исходного файла"""
+    if recorded != stamp:
+        return False
+    try:
+        return os.stat(target).st_mtime_ns >= os.stat(source).st_mtime_ns
+    except OSError:
+        return False
+
+
+def load_manifest(manifest_path):
+    """Чтение манифеста результатов (пустой словарь, если его нет или он поврежден)"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    """Атомарная запись манифеста результатов"""
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def convert_image(source, target, operations, workers=1):
+    """Обработка одного файла (выполняется в отдельном процессе)
+
+    Возвращает текст ошибки или None и статистику этапов, включая чтение и запись.
+    """
+    stats = []
+    try:
+        start = time.perf_counter()
+        image = QImage(source)
+        if image.isNull():
+            return "Не удалось загрузить изображение", stats
+        stats.append({'stage': 'load', 'seconds': time.perf_counter() - start, 'bytes': frame_cost(image)})
+
+        image, pipeline_stats = apply_operations(image, operations, workers)
+        stats.extend(pipeline_stats)
+
+        # Запись во временный файл: прерванная обработка не оставит
+        # недописанный результат, который потом сочтется актуальным
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        file_format = os.path.splitext(target)[1][1:].lower()
+        temp_path = target + '.tmp'
+        if not image.save(temp_path, file_format or None):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return f"Не удалось сохранить изображение в формате {file_format or '?'}", stats
+        os.replace(temp_path, target)
+        stats.append({'stage': 'save', 'seconds': time.perf_counter() - start, 'bytes': 0})
+        return None, stats
+    except Exception as e:
+        return f"Ошибка при обработке изображения: {str(e)}", stats
+
+
+def convert_batch(input_dir, output_dir, operations, jobs=None, output_format=None, force=False):
+    """Обработка всех изображений каталога в пуле процессов
+
+    Файлы, результат которых новее исходного и получен теми же операциями
+    в том же формате (по манифесту MANIFEST_FILE в output_dir), пропускаются,
+    если не force. Возвращает список ошибок (относительный путь, текст), число обработанных
+    и число пропущенных файлов и суммарную статистику этапов (merge_stats).
+    """
+    jobs = jobs or os.cpu_count() or 1
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+    pending = []
+    stamps = {}
+    skipped = 0
+    for relative_path in list_images(input_dir):
+        source = os.path.join(input_dir, relative_path)
+        target = output_path(output_dir, relative_path, output_format)
+        name = os.path.relpath(target, output_dir).replace(os.sep, '/')
+        stamp = output_stamp(operations, target)
+        if not force and is_up_to_date(source, target, stamp, manifest.get(name)):
+            skipped += 1
+        else:
+            pending.append((relative_path, source, target))
+            stamps[relative_path] = (name, stamp)
+
+    if jobs == 1 or len(pending) < 2:
+        # Один процесс - фильтры больших изображений сами делятся на потоки
+        results = [(path, convert_image(source, target, operations, None))
+                   for path, source, target in pending]
+    else:
+        # Каждый процесс обрабатывает свое изображение в одном потоке,
+        # чтобы процессы и потоки не делили одни и те же ядра
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            futures = {
+                pool.submit(convert_image, source, target, operations): path
+                for path, source, target in pending
+            }
+            results = [(futures[future], future.result()) for future in as_completed(futures)]
+
+    for path, (error, _) in results:
+        name, stamp = stamps[path]
+        if error:
+            manifest.pop(name, None)
+        else:
+            manifest[name] = stamp
+    if pending:
+        save_manifest(manifest_path, manifest)
+
+    stats = {}
+    for _, (_, image_stats) in results:
+        merge_stats(stats, image_stats)
+    errors = [(path, error) for path, (error, _) in results if error]
+    return errors, len(pending), skipped, list(stats.values())
+
+
+def parse_operations(value):
+    operations = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = set(operations) - set(OPERATIONS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"неизвестные операции: {', '.join(sorted(unknown))}")
+    return operations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Пакетная обработка изображений без графического интерфейса"
+    )
+    parser.add_argument('input_dir', help="каталог с исходными изображениями")
+    parser.add_argument('output_dir', help="каталог для результатов (структура подкаталогов сохраняется)")
+    parser.add_argument('--ops', type=parse_operations, required=True,
+                        help=f"операции через запятую, по порядку: {', '.join(OPERATIONS)}")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument('--format', help="формат результатов (png, jpg, ...); по умолчанию - как у исходных")
+    parser.add_argument('--force', action='store_true', help="обрабатывать и актуальные результаты")
+    parser.add_argument('--stats', action='store_true',
+                        help="время и память по этапам обработки (сумма по всем изображениям)")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"каталог не найден: {args.input_dir}")
+    output_format = args.format.lower().lstrip('.') if args.format else None
+    writable = {bytes(name).decode('ascii') for name in QImageWriter.supportedImageFormats()}
+    if output_format and output_format not in writable:
+        parser.error(f"формат не поддерживается для записи: {output_format}")
+
+    start = time.perf_counter()
+    errors, processed, skipped, stats = convert_batch(args.input_dir, args.output_dir, args.ops,
+                                               args.jobs, output_format, args.force)
+    elapsed = time.perf_counter() - start
+
+    for path, error in sorted(errors):
+        print(f"{path}: {error}", file=sys.stderr)
+    if args.stats and stats:
+        print(format_stats(stats), file=sys.stderr)
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Обработано изображений: {processed}, актуальных пропущено: {skipped}, "
+          f"с ошибками: {len(errors)}, {elapsed:.2f} с ({rate:.1f} изобр./с)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Запуск всех программ в одном постоянном процессе
+
+Первый запуск создает общий QApplication, заранее импортирует модули
+программ и ждет команд на локальном сокете (launcher_window.py). Повторный
+запуск - тонкий клиент: он передает команду работающему процессу и сразу
+завершается, а окно открывается без нового интерпретатора и импорта PyQt5:
+
+    python launcher.py             # окно со списком программ
+    python launcher.py Number_2    # сразу открыть программу (можно просто 2)
+"""
+
+import sys
+import os
+import getpass
+
+from PyQt5.QtNetwork import QLocalSocket
+
+
+# Программа: (класс главного окна, название)
+TOOLS = {
+    'Number_1': ('NumberAnalyzer', "Анализ чисел"),
+    'Number_2': ('TextEditor', "Текстовый редактор"),
+    'Number_3': ('ImageEditor', "Редактор изображений"),
+    'Number_4': ('AlphaImageEditor', "Регулировка прозрачности изображения"),
+    'Number_5': ('FlagGenerator', "Генератор полосатых флагов"),
+    'Number_6': ('SmileyPainter', "Смайлик Пейнтер"),
+    'Number_7': ('PianoApp', "Виртуальное Фортепиано"),
+    'Number_8': ('LSystemViewer', "Визуализатор L-систем"),
+}
+
+# Сколько клиент ждет подключения и ответа работающего процесса
+CONNECT_TIMEOUT_MS = 500
+REPLY_TIMEOUT_MS = 10000
+
+
+def server_name():
+    """Имя локального сокета: у каждого пользователя свой процесс"""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = str(os.getuid()) if hasattr(os, 'getuid') else 'user'
+    return f"number-tools-{user}"
+
+
+def resolve_tool(name):
+    """Имя модуля программы по имени или номеру (None, если такой нет)"""
+    if name.isdigit():
+        name = f"Number_{name}"
+    return name if name in TOOLS else None
+
+
+def send_command(command):
+    """Отправка команды работающему процессу: его ответ или None, если процесса нет"""
+    socket = QLocalSocket()
+    socket.connectToServer(server_name())
+    if not socket.waitForConnected(CONNECT_TIMEOUT_MS):
+        return None
+
+    socket.write(f"{command}\n".encode('utf-8'))
+    socket.flush()
+    reply = b''
+    while not reply.endswith(b'\n'):
+        if not socket.waitForReadyRead(REPLY_TIMEOUT_MS):
+            break
+        reply += bytes(socket.readAll())
+    socket.disconnectFromServer()
+    return reply.decode('utf-8', 'replace').strip() or "error: нет ответа"
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    tool = None
+    if argv:
+        tool = resolve_tool(argv[0])
+        if tool is None:
+            print(f"Неизвестная программа: {argv[0]}. Доступны: {', '.join(TOOLS)}", file=sys.stderr)
+            return 2
+
+    reply = send_command(f"open {tool}" if tool else "show")
+    if reply is not None:
+        if reply != 'ok':
+            print(reply, file=sys.stderr)
+            return 1
+        return 0
+
+    # Процесса еще нет - этот запуск становится им
+    from launcher_window import run
+    return run(tool)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
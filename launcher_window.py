@@ -0,0 +1,163 @@
+"""Окно запуска программ и сервер команд для тонкого клиента (launcher.py)"""
+
+import sys
+import os
+import importlib
+from PyQt5 import QtWidgets, sip
+from PyQt5.QtWidgets import QApplication, QMessageBox, QListWidgetItem, QAction
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtNetwork import QLocalServer
+
+from ui_loader import load_ui
+from launcher import TOOLS, server_name, send_command
+
+
+class LauncherWindow(QtWidgets.QMainWindow):
+    def __init__(self):
+        super().__init__()
+
+        # Загрузка интерфейса из файла
+        load_ui('launcher.ui', self)
+
+        # Открытые окна программ (удаляются из списка после закрытия)
+        self.windows = []
+
+        first_action = self.menuПрограммы.actions()[0]
+        for name, (class_name, title) in TOOLS.items():
+            item = QListWidgetItem(title)
+            item.setData(Qt.UserRole, name)
+            self.toolList.addItem(item)
+
+            action = QAction(title, self)
+            action.triggered.connect(lambda checked, name=name: self.open_tool(name))
+            self.menuПрограммы.insertAction(first_action, action)
+        self.toolList.setCurrentRow(0)
+
+        self.toolList.itemActivated.connect(lambda item: self.open_tool(item.data(Qt.UserRole)))
+        self.openButton.clicked.connect(self.open_selected)
+        self.actionExit.triggered.connect(self.exit_app)
+
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self.accept_connections)
+
+        # Модули программ импортируются заранее, по одному за проход цикла
+        # событий, чтобы окно запуска не замирало
+        self.preload_queue = list(TOOLS)
+        QTimer.singleShot(0, self.preload_next)
+
+    def exit_app(self):
+        """Выход: процесс завершается, только если все окна согласились закрыться"""
+        QApplication.closeAllWindows()
+        if not any(widget.isVisible() for widget in QApplication.topLevelWidgets()):
+            QApplication.quit()
+
+    def listen(self, remove_stale=False):
+        """Прием команд на локальном сокете; False, если сокет занят"""
+        if remove_stale:
+            # Сокет остался после аварийного завершения прошлого процесса
+            QLocalServer.removeServer(server_name())
+        return self.server.listen(server_name())
+
+    def preload_next(self):
+        if not self.preload_queue:
+            self.statusbar.showMessage("Программы загружены", 3000)
+            return
+        name = self.preload_queue.pop(0)
+        try:
+            importlib.import_module(name)
+        except Exception as error:
+            self.statusbar.showMessage(f"Не удалось загрузить {name}: {error}")
+        QTimer.singleShot(0, self.preload_next)
+
+    def open_selected(self):
+        item = self.toolList.currentItem()
+        if item is not None:
+            self.open_tool(item.data(Qt.UserRole))
+
+    def open_tool(self, name):
+        """Новое окно программы; текст ошибки или None"""
+        class_name, title = TOOLS[name]
+        try:
+            window = getattr(importlib.import_module(name), class_name)()
+        except Exception as error:
+            self.show_error(f"Не удалось открыть «{title}»: {error}")
+            return str(error)
+
+        # Закрытое окно удаляется, а не остается в памяти процесса
+        window.setAttribute(Qt.WA_DeleteOnClose)
+        window.destroyed.connect(self.forget_closed)
+        self.windows.append(window)
+        self.raise_window(window)
+        self.update_status()
+        return None
+
+    def forget_closed(self):
+        self.windows = [window for window in self.windows if not sip.isdeleted(window)]
+        self.update_status()
+
+    def raise_window(self, window):
+        window.show()
+        window.setWindowState(window.windowState() & ~Qt.WindowMinimized)
+        window.raise_()
+        window.activateWindow()
+
+    def update_status(self):
+        self.statusbar.showMessage(f"Открыто окон: {len(self.windows)}")
+
+    def accept_connections(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.readyRead.connect(lambda socket=socket: self.read_command(socket))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def read_command(self, socket):
+        """Команда клиента: 'show' или 'open <программа>'; ответ 'ok' или 'error: ...'"""
+        if not socket.canReadLine():
+            return
+        command = bytes(socket.readLine()).decode('utf-8', 'replace').split()
+
+        if command == ['show']:
+            self.raise_window(self)
+            reply = 'ok'
+        elif len(command) == 2 and command[0] == 'open' and command[1] in TOOLS:
+            error = self.open_tool(command[1])
+            reply = 'ok' if error is None else f"error: {error}"
+        else:
+            reply = f"error: неизвестная команда {' '.join(command)}"
+
+        socket.write(f"{reply}\n".encode('utf-8'))
+        socket.flush()
+        socket.disconnectFromServer()
+
+    def show_error(self, message):
+        """Показать сообщение об ошибке"""
+        QMessageBox.critical(self, "Ошибка", message)
+        self.statusbar.showMessage(f"Ошибка: {message}")
+
+
+def run(tool=None):
+    """Запуск постоянного процесса; tool - программа, которую открыть сразу"""
+    # Программы ищут свои .ui-файлы в текущем каталоге
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    app = QApplication(sys.argv)
+    # Процесс остается после закрытия последнего окна и ждет следующих
+    # запусков; завершается он только пунктом «Выход»
+    app.setQuitOnLastWindowClosed(False)
+
+    # Установка стиля приложения
+    app.setStyle('Fusion')
+
+    window = LauncherWindow()
+    if not window.listen():
+        # Сокет занят: либо одновременно запустился другой процесс, либо
+        # сокет остался от упавшего
+        reply = send_command(f"open {tool}" if tool else "show")
+        if reply is not None:
+            return 0 if reply == 'ok' else 1
+        if not window.listen(remove_stale=True):
+            window.statusbar.showMessage("Не удалось открыть сокет: повторные запуски не найдут это окно")
+
+    if tool is None or window.open_tool(tool) is not None:
+        window.show()
+    return app.exec_()
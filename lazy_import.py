@@ -0,0 +1,34 @@
+"""Отложенный импорт тяжелых модулей (numpy и т.п.)
+
+Модуль загружается при первом обращении к его атрибуту, поэтому запуск
+программы не ждет импорта, который может так и не понадобиться.
+"""
+
+import importlib
+import importlib.util
+
+
+class LazyModule:
+    """Заместитель модуля: импортирует его при первом обращении к атрибуту"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+def lazy_import(name):
+    """Заместитель модуля name или None, если модуль не установлен"""
+    try:
+        if importlib.util.find_spec(name) is None:
+            return None
+    except (ImportError, ValueError):
+        return None
+    return LazyModule(name)
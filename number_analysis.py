@@ -0,0 +1,1120 @@
+"""Разбор текстовых файлов с целыми числами и подсчет статистики без GUI"""
+
+import sys
+import os
+import re
+import csv
+import glob
+import json
+import math
+import mmap
+import codecs
+import hashlib
+import argparse
+import random
+import operator
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lazy_import import lazy_import
+
+# numpy загружается при первом использовании, а не при запуске
+np = lazy_import('numpy')
+
+NUMPY_AVAILABLE = np is not None
+
+
+# Размер блока при потоковом чтении файла (в байтах)
+CHUNK_SIZE = 1024 * 1024
+
+# Способы разбора файла
+ENGINE_PYTHON = 'python'
+ENGINE_NUMPY = 'numpy'
+ENGINES = (ENGINE_PYTHON, ENGINE_NUMPY)
+
+# Пробельные символы ASCII, по которым str.split() разделяет токены
+ASCII_WHITESPACE = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+ASCII_WHITESPACE_RE = re.compile(rb'[ \t\n\r\x0b\x0c\x1c-\x1f]')
+
+# Начиная с этого размера файл разбирается параллельно в нескольких процессах
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+
+# Число диапазонов на один процесс: чем больше, тем точнее прогресс и отмена
+RANGES_PER_WORKER = 4
+
+# Число цифр, которое гарантированно помещается в int64
+MAX_INT64_DIGITS = 18
+
+# Точность оценки квантилей: чем больше, тем больше центроидов в t-digest
+TDIGEST_COMPRESSION = 200
+
+# Число интервалов гистограммы
+HISTOGRAM_BINS = 10
+
+# Из порции чисел в t-digest попадает случайная выборка не больше этого
+# размера (с весами): сортировать всю порцию ради оценок квантилей дорого
+DIGEST_SAMPLE_SIZE = 4096
+
+# Сколько первых байтов файла запоминается для обнаружения его подмены
+FINGERPRINT_SIZE = 64
+
+# Двоичный кэш разобранных чисел рядом с исходным файлом
+SIDECAR_SUFFIX = '.numcache'
+SIDECAR_MAGIC = b'NUMCACH1'
+SIDECAR_SAMPLE_SIZE = 64 * 1024
+
+# Формат сохраненной статистики: при его изменении кэш пересчитывается по числам
+STATS_FORMAT = f'tdigest-{TDIGEST_COMPRESSION}'
+
+
+class AnalysisCancelled(Exception):
+    """Анализ файла был отменен пользователем"""
+
+
+def to_float(value):
+    """Преобразование числа в float с заменой переполнения на бесконечность"""
+    try:
+        return float(value)
+    except OverflowError:
+        return math.inf if value > 0 else -math.inf
+
+
+def safe_divide(numerator, denominator):
+    """Деление целых чисел с заменой переполнения на бесконечность"""
+    try:
+        return numerator / denominator
+    except OverflowError:
+        return math.inf if (numerator > 0) == (denominator > 0) else -math.inf
+
+
+def interpolate(x0, y0, x1, y1, x):
+    """Линейная интерполяция между точками (x0, y0) и (x1, y1)"""
+    if x1 == x0:
+        return y1
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+class TDigest:
+    """Объединяемый t-digest для оценки квантилей за один проход
+
+    Распределение хранится как отсортированный список центроидов
+    (среднее, вес); их число ограничено величиной compression, поэтому
+    память не зависит от количества чисел.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.centroids = []
+        self.total_weight = 0
+
+    def next_limit(self, position, total):
+        """Накопленный вес, до которого может расти центроид, начатый в position"""
+        k = self.compression / (2 * math.pi) * math.asin(2 * position / total - 1) + 1
+        k = min(k, self.compression / 4)
+        return total * (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def add_sorted(self, values, weight=1):
+        """Добавление отсортированной порции чисел (список или массив NumPy)
+
+        weight - сколько чисел представляет каждое значение (для выборки).
+        """
+        count = len(values)
+        if not count:
+            return
+
+        bounds = [0]
+        while bounds[-1] < count:
+            limit = int(self.next_limit(bounds[-1], count))
+            bounds.append(min(count, max(limit, bounds[-1] + 1)))
+
+        if np is not None and isinstance(values, np.ndarray):
+            sizes = np.diff(bounds)
+            sums = np.add.reduceat(values.astype(np.float64), bounds[:-1])
+            centroids = list(zip((sums / sizes).tolist(), (sizes * weight).tolist()))
+        else:
+            centroids = [
+                (safe_divide(sum(values[start:end]), end - start), (end - start) * weight)
+                for start, end in zip(bounds, bounds[1:])
+            ]
+
+        self.merge_centroids(centroids)
+
+    def merge(self, other):
+        """Объединение с t-digest другой порции чисел"""
+        if other.centroids:
+            self.merge_centroids(other.centroids)
+
+    def merge_centroids(self, centroids):
+        """Слияние центроидов с последующим сжатием"""
+        centroids = sorted(self.centroids + list(centroids))
+        total = sum(weight for _, weight in centroids)
+
+        merged = []
+        position = 0
+        mean, weight = centroids[0]
+        limit = self.next_limit(position, total)
+        for next_mean, next_weight in centroids[1:]:
+            if position + weight + next_weight <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged.append((mean, weight))
+                position += weight
+                limit = self.next_limit(position, total)
+                mean, weight = next_mean, next_weight
+        merged.append((mean, weight))
+
+        self.centroids = merged
+        self.total_weight = total
+
+    def points(self, min_value, max_value):
+        """Опорные точки (накопленный вес, значение) кусочно-линейной функции распределения"""
+        points = [(0, to_float(min_value))]
+        position = 0
+        for mean, weight in self.centroids:
+            points.append((position + weight / 2, mean))
+            position += weight
+        points.append((self.total_weight, to_float(max_value)))
+        return points
+
+    def quantile(self, q, min_value, max_value):
+        """Оценка квантиля уровня q"""
+        target = q * self.total_weight
+        points = self.points(min_value, max_value)
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if target <= x1:
+                return interpolate(x0, y0, x1, y1, target)
+        return points[-1][1]
+
+    def count_below(self, value, min_value, max_value):
+        """Оценка количества чисел, меньших value
+
+        Одиночные центроиды учитываются точно, остальные считаются
+        равномерно распределенными между серединами соседних центроидов.
+        """
+        means = [mean for mean, _ in self.centroids]
+        lows = [to_float(min_value)] + [(a + b) / 2 for a, b in zip(means, means[1:])]
+        highs = lows[1:] + [to_float(max_value)]
+
+        count = 0
+        for (mean, weight), low, high in zip(self.centroids, lows, highs):
+            if weight == 1 or high <= low:
+                if mean < value:
+                    count += weight
+            elif value >= high:
+                count += weight
+            elif value > low:
+                count += weight * (value - low) / (high - low)
+        return count
+
+
+class NumberStats:
+    """Накопительная статистика по целым числам без хранения самих чисел
+
+    Все агрегаты объединяются через merge, поэтому частичные результаты
+    разных блоков и процессов можно складывать в любом порядке.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.sum_squares = 0
+        self.min_value = None
+        self.max_value = None
+        self.digest = TDigest()
+        # Фиксированное зерно: повторный анализ того же файла дает те же оценки
+        self.sampler = random.Random(0)
+
+    def digest_sample(self, values):
+        """Выборка порции для t-digest: (значения, вес каждого)"""
+        count = len(values)
+        if count <= DIGEST_SAMPLE_SIZE:
+            return values, 1
+        indices = self.sampler.sample(range(count), DIGEST_SAMPLE_SIZE)
+        if np is not None and isinstance(values, np.ndarray):
+            return values[indices], count / DIGEST_SAMPLE_SIZE
+        return [values[i] for i in indices], count / DIGEST_SAMPLE_SIZE
+
+    def update(self, numbers):
+        """Учет очередной порции чисел"""
+        if not numbers:
+            return
+
+        self.accumulate(min(numbers), max(numbers), sum(numbers), len(numbers),
+                        sum(map(operator.mul, numbers, numbers)))
+        sample, weight = self.digest_sample(numbers)
+        self.digest.add_sorted(sorted(sample), weight)
+
+    def update_array(self, values):
+        """Учет порции чисел из массива NumPy (int64)"""
+        if not len(values):
+            return
+
+        chunk_min = int(values.min())
+        chunk_max = int(values.max())
+
+        # Суммы в int64 точны, только если не могут переполниться
+        bound = max(abs(chunk_min), abs(chunk_max))
+        if bound * len(values) < 2 ** 63:
+            chunk_total = int(values.sum())
+        else:
+            chunk_total = sum(values.tolist())
+        if bound * bound * len(values) < 2 ** 63:
+            chunk_squares = int((values * values).sum())
+        elif bound < 2 ** 32:
+            # Квадраты помещаются в uint64: старшие и младшие 32 бита суммируются отдельно
+            squares = np.abs(values).astype(np.uint64) ** 2
+            chunk_squares = ((int((squares >> np.uint64(32)).sum()) << 32)
+                             + int((squares & np.uint64(0xFFFFFFFF)).sum()))
+        else:
+            numbers = values.tolist()
+            chunk_squares = sum(map(operator.mul, numbers, numbers))
+
+        self.accumulate(chunk_min, chunk_max, chunk_total, len(values), chunk_squares)
+        sample, weight = self.digest_sample(values)
+        self.digest.add_sorted(np.sort(sample), weight)
+
+    def merge(self, other):
+        """Объединение с частичной статистикой другого диапазона файла"""
+        if other.count:
+            self.accumulate(other.min_value, other.max_value, other.total, other.count,
+                            other.sum_squares)
+            self.digest.merge(other.digest)
+
+    def accumulate(self, chunk_min, chunk_max, chunk_total, chunk_count, chunk_squares):
+        """Добавление готовых агрегатов порции чисел"""
+        if self.min_value is None or chunk_min < self.min_value:
+            self.min_value = chunk_min
+        if self.max_value is None or chunk_max > self.max_value:
+            self.max_value = chunk_max
+
+        self.total += chunk_total
+        self.count += chunk_count
+        self.sum_squares += chunk_squares
+
+    def to_dict(self):
+        """Представление статистики для сохранения в JSON"""
+        return {
+            'count': self.count,
+            'total': self.total,
+            'sum_squares': self.sum_squares,
+            'min': self.min_value,
+            'max': self.max_value,
+            'centroids': self.digest.centroids,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Восстановление статистики, сохраненной через to_dict"""
+        stats = cls()
+        stats.count = data['count']
+        stats.total = data['total']
+        stats.sum_squares = data['sum_squares']
+        stats.min_value = data['min']
+        stats.max_value = data['max']
+        stats.digest.centroids = [tuple(centroid) for centroid in data['centroids']]
+        stats.digest.total_weight = stats.count
+        return stats
+
+    def quantile(self, q):
+        """Оценка квантиля уровня q (None, если чисел нет)"""
+        if not self.count:
+            return None
+        return self.digest.quantile(q, self.min_value, self.max_value)
+
+    def histogram(self, bins=HISTOGRAM_BINS):
+        """Оценка гистограммы: список (начало, конец, количество) равных интервалов
+
+        Интервалы полуоткрытые, последний включает максимум. Количества -
+        оценки по t-digest, а не точный подсчет: часть веса центроида может
+        попасть в соседний пустой интервал.
+        """
+        if not self.count:
+            return []
+
+        low = to_float(self.min_value)
+        high = to_float(self.max_value)
+        if self.min_value == self.max_value:
+            return [(low, high, self.count)]
+
+        edges = [low + (high - low) * i / bins for i in range(bins + 1)]
+        ranks = [0]
+        for edge in edges[1:-1]:
+            ranks.append(round(self.digest.count_below(edge, self.min_value, self.max_value)))
+        ranks.append(self.count)
+
+        return [
+            (start, end, right - left)
+            for start, end, left, right in zip(edges, edges[1:], ranks, ranks[1:])
+        ]
+
+    @property
+    def median_value(self):
+        """Медиана (оценка по t-digest)"""
+        return self.quantile(0.5)
+
+    @property
+    def p90_value(self):
+        """90-й процентиль (оценка по t-digest)"""
+        return self.quantile(0.9)
+
+    @property
+    def p99_value(self):
+        """99-й процентиль (оценка по t-digest)"""
+        return self.quantile(0.99)
+
+    @property
+    def std_value(self):
+        """Стандартное отклонение по генеральной совокупности (точное)"""
+        if not self.count:
+            return None
+        numerator = self.count * self.sum_squares - self.total ** 2
+        variance = safe_divide(numerator, self.count ** 2)
+        if variance != math.inf:
+            return math.sqrt(variance)
+
+        # Дисперсия не помещается в float, но само отклонение может поместиться
+        return safe_divide(math.isqrt(numerator), self.count)
+
+    @property
+    def avg_value(self):
+        """Среднее значение (None, если чисел нет)"""
+        if not self.count:
+            return None
+        return self.total / self.count
+
+
+def iter_token_chunks(file, chunk_size=CHUNK_SIZE, encoding='utf-8'):
+    """Потоковое разбиение двоичного файла на токены блоками фиксированного размера"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    tail = ''
+    while True:
+        data = file.read(chunk_size)
+        chunk = decoder.decode(data, final=not data)
+
+        if chunk:
+            tokens = (tail + chunk).split()
+
+            # Последний токен может продолжаться в следующем блоке
+            if tokens and not chunk[-1].isspace():
+                tail = tokens.pop()
+            else:
+                tail = ''
+
+            yield tokens
+
+        if not data:
+            break
+
+    if tail:
+        yield [tail]
+
+
+def parse_integers(tokens):
+    """Преобразование токенов в целые числа с пропуском нечисловых значений"""
+    numbers = []
+    for num_str in tokens:
+        try:
+            numbers.append(int(num_str))
+        except ValueError:
+            # Пропускаем нечисловые значения
+            continue
+    return numbers
+
+
+def last_whitespace(data):
+    """Позиция последнего пробельного символа ASCII в блоке (-1, если его нет)"""
+    return max(data.rfind(char) for char in ASCII_WHITESPACE)
+
+
+def iter_byte_chunks(file, chunk_size=CHUNK_SIZE):
+    """Чтение двоичного файла блоками, разрезанными по пробельным символам ASCII"""
+    tail = b''
+    while True:
+        data = file.read(chunk_size)
+        if not data:
+            break
+
+        data = tail + data
+        cut = last_whitespace(data)
+        if cut < 0:
+            # В блоке нет разделителей: токен продолжается дальше
+            tail = data
+            continue
+
+        tail = data[cut + 1:]
+        yield data[:cut + 1]
+
+    if tail:
+        yield tail
+
+
+def parse_integers_numpy(data):
+    """Векторный разбор блока байтов в массив int64
+
+    Возвращает None, если в блоке есть что-то кроме десятичных чисел со
+    знаком и пробелов ASCII или слишком длинные числа; такой блок нужно
+    разобрать медленным способом.
+    """
+    chars = np.frombuffer(data, dtype=np.uint8)
+    if not len(chars):
+        return np.empty(0, dtype=np.int64)
+
+    # Сравнения на беззнаковых байтах: (c - a) < n означает a <= c < a + n
+    is_space = (chars == ord(' ')) | ((chars - 0x09) < 5) | ((chars - 0x1c) < 4)
+    is_digit = (chars - ord('0')) < 10
+    is_sign = (chars == ord('+')) | (chars == ord('-'))
+    if not (is_space | is_digit | is_sign).all():
+        return None
+
+    # Начала и концы токенов
+    prev_space = np.empty_like(is_space)
+    prev_space[0] = True
+    prev_space[1:] = is_space[:-1]
+    next_space = np.empty_like(is_space)
+    next_space[-1] = True
+    next_space[:-1] = is_space[1:]
+    is_start = ~is_space & prev_space
+    is_end = ~is_space & next_space
+
+    # Знак допустим только в начале токена и только перед цифрой
+    next_digit = np.zeros_like(is_digit)
+    next_digit[:-1] = is_digit[1:]
+    if (is_sign & ~(is_start & next_digit)).any():
+        return None
+
+    starts = np.flatnonzero(is_start)
+    ends = np.flatnonzero(is_end) + 1
+    if not len(starts):
+        return np.empty(0, dtype=np.int64)
+
+    negative = chars[starts] == ord('-')
+    digit_counts = ends - starts - is_sign[starts]
+    width = digit_counts.max()
+    if width > MAX_INT64_DIGITS:
+        return None
+
+    # Сборка чисел по разрядам: k-й разряд стоит на позиции end - 1 - k
+    values = np.zeros(len(starts), dtype=np.int64)
+    for k in range(width):
+        digits = (chars[ends - 1 - k] - ord('0')).astype(np.int64)
+        digits[digit_counts <= k] = 0
+        values += digits * 10 ** k
+
+    np.negative(values, out=values, where=negative)
+    return values
+
+
+def format_histogram(histogram):
+    """Текстовое представление гистограммы: по строке на интервал
+
+    Количества - оценки по t-digest (границы интервалов известны только в
+    конце прохода), поэтому они помечены знаком ≈.
+    """
+    lines = []
+    for i, (start, end, count) in enumerate(histogram):
+        closing = ']' if i == len(histogram) - 1 else ')'
+        lines.append(f"[{start:.2f}; {end:.2f}{closing}: ≈{count}")
+    return "\n".join(lines)
+
+
+def check_engine(engine):
+    """Проверка, что выбранный способ разбора доступен"""
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный способ разбора: {engine}")
+    if engine == ENGINE_NUMPY and np is None:
+        raise RuntimeError("Для разбора через NumPy требуется установить numpy")
+
+
+def update_stats_from_block(stats, data, engine):
+    """Учет блока байтов, который начинается и заканчивается на границе токенов
+
+    Возвращает разобранные числа (список или массив NumPy).
+    """
+    if engine == ENGINE_NUMPY:
+        values = parse_integers_numpy(data)
+        if values is not None:
+            stats.update_array(values)
+            return values
+
+    # Медленный путь (для NumPy - только для блока с посторонними токенами)
+    numbers = parse_integers(data.decode('utf-8').split())
+    stats.update(numbers)
+    return numbers
+
+
+def analyze_numbers(file_path, chunk_size=CHUNK_SIZE, progress=None, engine=ENGINE_PYTHON,
+                    values_sink=None):
+    """Потоковый подсчет статистики по целым числам в файле
+
+    progress(bytes_read, count) вызывается после каждого блока и может
+    прервать анализ, выбросив AnalysisCancelled. values_sink(numbers)
+    получает числа каждого блока по порядку.
+    """
+    check_engine(engine)
+
+    stats = NumberStats()
+    with open(file_path, 'rb') as file:
+        if engine == ENGINE_NUMPY:
+            for data in iter_byte_chunks(file, chunk_size):
+                numbers = update_stats_from_block(stats, data, engine)
+                if values_sink is not None:
+                    values_sink(numbers)
+                if progress is not None:
+                    progress(file.tell(), stats.count)
+        else:
+            for tokens in iter_token_chunks(file, chunk_size):
+                numbers = parse_integers(tokens)
+                stats.update(numbers)
+                if values_sink is not None:
+                    values_sink(numbers)
+                if progress is not None:
+                    progress(file.tell(), stats.count)
+    return stats
+
+
+def split_ranges(buffer, parts):
+    """Разбиение буфера на диапазоны по пробельным символам ASCII
+
+    Граница всегда стоит сразу после пробела, поэтому ни один токен не
+    попадает в два диапазона.
+    """
+    size = len(buffer)
+    bounds = [0]
+    for i in range(1, parts):
+        pos = max(size * i // parts, bounds[-1])
+        match = ASCII_WHITESPACE_RE.search(buffer, pos)
+        if match is None:
+            break
+        bounds.append(match.end())
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def analyze_range(file_path, start, end, engine=ENGINE_PYTHON, chunk_size=CHUNK_SIZE):
+    """Статистика по диапазону байтов файла (выполняется в отдельном процессе)"""
+    stats = NumberStats()
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            pos = start
+            while pos < end:
+                # Блок продлевается до ближайшего пробела, чтобы не разрезать токен
+                stop = min(pos + chunk_size, end)
+                if stop < end:
+                    match = ASCII_WHITESPACE_RE.search(buffer, stop, end)
+                    stop = match.end() if match else end
+
+                update_stats_from_block(stats, buffer[pos:stop], engine)
+                pos = stop
+    return stats
+
+
+def analyze_numbers_parallel(file_path, workers=None, progress=None, engine=ENGINE_PYTHON):
+    """Параллельный подсчет статистики по отображенному в память файлу
+
+    Результат совпадает с analyze_numbers: суммы считаются точно, а
+    частичные результаты диапазонов объединяются через NumberStats.merge.
+    """
+    check_engine(engine)
+    workers = workers or os.cpu_count() or 1
+
+    stats = NumberStats()
+    if os.path.getsize(file_path) == 0:
+        return stats
+
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            ranges = split_ranges(buffer, workers * RANGES_PER_WORKER)
+
+    # fork из процесса с запущенными потоками Qt небезопасен
+    context = multiprocessing.get_context('spawn')
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        futures = {
+            pool.submit(analyze_range, file_path, start, end, engine): end - start
+            for start, end in ranges
+        }
+        bytes_read = 0
+        for future in as_completed(futures):
+            stats.merge(future.result())
+            bytes_read += futures[future]
+            if progress is not None:
+                progress(bytes_read, stats.count)
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return stats
+
+
+def sidecar_path(file_path):
+    """Путь к двоичному кэшу разобранных чисел для файла"""
+    return file_path + SIDECAR_SUFFIX
+
+
+def content_key(file, info):
+    """Ключ содержимого файла: размер, время изменения и хэш выборки блоков
+
+    Хэшируются начало, середина и конец файла, чтобы проверка кэша не
+    требовала чтения всего файла.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for pos in (0, info.st_size // 2, info.st_size - SIDECAR_SAMPLE_SIZE):
+        file.seek(max(pos, 0))
+        digest.update(file.read(SIDECAR_SAMPLE_SIZE))
+    return {'size': info.st_size, 'mtime_ns': info.st_mtime_ns, 'hash': digest.hexdigest()}
+
+
+class SidecarWriter:
+    """Потоковая запись двоичного кэша: числа int64, затем заголовок JSON
+
+    Формат: SIDECAR_MAGIC, числа (little-endian int64), заголовок JSON,
+    длина заголовка (8 байт) и снова SIDECAR_MAGIC. Если встретилось
+    число вне диапазона int64, числа не сохраняются - остается только
+    итоговая статистика, а пересчет идет через текстовый разбор.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = path + '.tmp'
+        self.file = open(self.temp_path, 'wb')
+        self.file.write(SIDECAR_MAGIC)
+        self.count = 0
+        self.has_values = True
+
+    def write(self, numbers):
+        """Добавление чисел очередного блока"""
+        if not self.has_values or not len(numbers):
+            return
+
+        if np is not None and isinstance(numbers, np.ndarray):
+            data = numbers.astype('<i8').tobytes()
+        else:
+            try:
+                packed = array('q', numbers)
+            except OverflowError:
+                # Число не помещается в int64: числа в кэш не попадут
+                self.has_values = False
+                self.file.truncate(len(SIDECAR_MAGIC))
+                # truncate не двигает позицию: иначе заголовок ляжет после дыры из нулей
+                self.file.seek(len(SIDECAR_MAGIC))
+                return
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            data = packed.tobytes()
+
+        self.file.write(data)
+        self.count += len(numbers)
+
+    def commit(self, key, stats):
+        """Запись заголовка и атомарная замена кэша"""
+        header = dict(key, stats_format=STATS_FORMAT, stats=stats.to_dict(),
+                      values_count=self.count if self.has_values else None)
+        data = json.dumps(header).encode('utf-8')
+        self.file.write(data)
+        self.file.write(len(data).to_bytes(8, 'little'))
+        self.file.write(SIDECAR_MAGIC)
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def discard(self):
+        """Отказ от записи кэша"""
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+def read_sidecar_header(sidecar):
+    """Чтение заголовка двоичного кэша (None, если файл поврежден)"""
+    sidecar.seek(0, os.SEEK_END)
+    end = sidecar.tell()
+    if end < 2 * len(SIDECAR_MAGIC) + 8:
+        return None
+
+    sidecar.seek(end - len(SIDECAR_MAGIC) - 8)
+    footer = sidecar.read()
+    if footer[8:] != SIDECAR_MAGIC:
+        return None
+    header_size = int.from_bytes(footer[:8], 'little')
+
+    sidecar.seek(end - len(SIDECAR_MAGIC) - 8 - header_size)
+    try:
+        return json.loads(sidecar.read(header_size).decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def stats_from_sidecar_values(sidecar, count, engine, chunk_size=CHUNK_SIZE):
+    """Пересчет статистики по числам из кэша, отображенным в память"""
+    stats = NumberStats()
+    if not count:
+        return stats
+
+    step = max(chunk_size // 8, 1)
+    with mmap.mmap(sidecar.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        if engine == ENGINE_NUMPY:
+            values = np.frombuffer(buffer, dtype='<i8', count=count, offset=len(SIDECAR_MAGIC))
+            for start in range(0, count, step):
+                stats.update_array(values[start:start + step])
+            del values  # mmap нельзя закрыть, пока на него есть ссылки
+        else:
+            view = memoryview(buffer)[len(SIDECAR_MAGIC):len(SIDECAR_MAGIC) + count * 8]
+            for start in range(0, count * 8, step * 8):
+                numbers = array('q')
+                numbers.frombytes(view[start:start + step * 8])
+                if sys.byteorder == 'big':
+                    numbers.byteswap()
+                stats.update(numbers.tolist())
+            view.release()
+    return stats
+
+
+def load_sidecar(file_path, engine=ENGINE_PYTHON):
+    """Статистика из двоичного кэша (None, если кэша нет или он устарел)"""
+    try:
+        with open(file_path, 'rb') as file:
+            key = content_key(file, os.fstat(file.fileno()))
+        with open(sidecar_path(file_path), 'rb') as sidecar:
+            header = read_sidecar_header(sidecar)
+            if header is None or any(header.get(name) != value for name, value in key.items()):
+                return None
+            if header.get('stats_format') == STATS_FORMAT:
+                return NumberStats.from_dict(header['stats'])
+            if header.get('values_count') is not None:
+                return stats_from_sidecar_values(sidecar, header['values_count'], engine)
+    except OSError:
+        pass
+    return None
+
+
+def analyze_numbers_cached(file_path, progress=None, engine=ENGINE_PYTHON, parallel=False):
+    """Анализ с использованием двоичного кэша рядом с файлом
+
+    При совпадении ключа содержимого статистика берется из кэша без
+    разбора текста. Иначе файл разбирается (параллельно, если parallel),
+    и кэш записывается заново. При параллельном разборе сохраняется только
+    итоговая статистика, без самих чисел.
+    """
+    check_engine(engine)
+    stats = load_sidecar(file_path, engine)
+    if stats is not None:
+        if progress is not None:
+            progress(os.path.getsize(file_path), stats.count)
+        return stats
+
+    with open(file_path, 'rb') as file:
+        key = content_key(file, os.fstat(file.fileno()))
+
+    try:
+        writer = SidecarWriter(sidecar_path(file_path))
+    except OSError:
+        writer = None  # Каталог недоступен для записи: работаем без кэша
+
+    try:
+        if parallel:
+            stats = analyze_numbers_parallel(file_path, progress=progress, engine=engine)
+            if writer is not None:
+                writer.has_values = False
+        else:
+            stats = analyze_numbers(file_path, progress=progress, engine=engine,
+                                    values_sink=writer.write if writer is not None else None)
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+
+    if writer is not None:
+        # Файл мог измениться во время разбора - тогда кэш не записывается
+        with open(file_path, 'rb') as file:
+            unchanged = content_key(file, os.fstat(file.fileno())) == key
+        if unchanged:
+            writer.commit(key, stats)
+        else:
+            writer.discard()
+    return stats
+
+
+class FollowState:
+    """Состояние инкрементального анализа дописываемого файла
+
+    Хранит смещение, до которого файл уже учтен в статистике, и
+    незавершенный токен в конце файла, поэтому при росте файла
+    разбираются только новые байты. Если файл был усечен или подменен
+    (ротация логов), он разбирается заново с начала.
+    """
+
+    def __init__(self, file_path, engine=ENGINE_PYTHON, chunk_size=CHUNK_SIZE):
+        self.file_path = file_path
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def reset(self):
+        """Сброс к состоянию до чтения файла"""
+        self.stats = NumberStats()
+        self.offset = 0
+        self.tail = b''
+        self.fingerprint = b''
+        self.signature = None
+
+    @staticmethod
+    def file_signature(info):
+        return info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns
+
+    def has_changes(self):
+        """Изменился ли файл с момента последнего разбора"""
+        try:
+            info = os.stat(self.file_path)
+        except OSError:
+            return False  # Файл мог быть временно удален при ротации
+        return self.file_signature(info) != self.signature
+
+    def was_replaced(self, file, info):
+        """Был ли файл усечен или подменен с момента последнего разбора"""
+        if self.signature is None:
+            return False
+        if (info.st_dev, info.st_ino) != self.signature[:2]:
+            return True
+        if info.st_size < self.offset + len(self.tail):
+            return True
+
+        file.seek(0)
+        return file.read(len(self.fingerprint)) != self.fingerprint
+
+    def poll(self, progress=None):
+        """Разбор байтов, дописанных с прошлого вызова
+
+        Возвращает True, если файл пришлось перечитать с начала.
+        progress(bytes_read, count) ведет себя так же, как в analyze_numbers.
+        """
+        check_engine(self.engine)
+        with open(self.file_path, 'rb') as file:
+            info = os.fstat(file.fileno())
+            replaced = self.was_replaced(file, info)
+            if replaced:
+                self.reset()
+
+            # Незавершенный токен уже в памяти: читаем только то, что после него
+            tail = self.tail
+            file.seek(self.offset + len(tail))
+            while True:
+                data = file.read(self.chunk_size)
+                if not data:
+                    break
+
+                data = tail + data
+                cut = last_whitespace(data)
+                if cut < 0:
+                    tail = data
+                    continue
+
+                # Статистика и смещение меняются вместе, поэтому отмена
+                # между блоками оставляет состояние согласованным
+                update_stats_from_block(self.stats, data[:cut + 1], self.engine)
+                self.offset += cut + 1
+                tail = data[cut + 1:]
+                self.tail = tail
+                if progress is not None:
+                    progress(file.tell(), self.stats.count)
+
+            self.tail = tail
+            if len(self.fingerprint) < FINGERPRINT_SIZE:
+                file.seek(0)
+                self.fingerprint = file.read(FINGERPRINT_SIZE)
+
+        size = self.offset + len(self.tail)
+        self.signature = (info.st_dev, info.st_ino, size, info.st_mtime_ns)
+        return replaced
+
+    def current_stats(self):
+        """Статистика по всему прочитанному, включая незавершенный токен в конце"""
+        stats = NumberStats()
+        stats.merge(self.stats)
+        if self.tail:
+            try:
+                update_stats_from_block(stats, self.tail, self.engine)
+            except UnicodeDecodeError:
+                pass  # Символ в конце файла дописан не полностью
+        return stats
+
+
+# Файл кэша результатов пакетной обработки по умолчанию
+DEFAULT_CACHE_FILE = '.number_analysis_cache.json'
+
+# Столбцы CSV-сводки (гистограмма попадает только в JSON)
+SUMMARY_FIELDS = ('path', 'size', 'mtime_ns', 'count', 'min', 'max', 'avg',
+                  'median', 'p90', 'p99', 'std', 'error')
+
+
+def summarize_stats(stats):
+    """Словарь с итоговой статистикой для сводки"""
+    return {
+        'count': stats.count,
+        'min': stats.min_value,
+        'max': stats.max_value,
+        'avg': stats.avg_value,
+        'median': stats.median_value,
+        'p90': stats.p90_value,
+        'p99': stats.p99_value,
+        'std': stats.std_value,
+        # Количества в интервалах - оценки по t-digest
+        'histogram': [list(bin_) for bin_ in stats.histogram()],
+    }
+
+
+def analyze_file_summary(file_path, engine=ENGINE_PYTHON, use_sidecar=False):
+    """Анализ одного файла для пакетной обработки (выполняется в отдельном процессе)"""
+    try:
+        if use_sidecar:
+            stats = analyze_numbers_cached(file_path, engine=engine)
+        else:
+            stats = analyze_numbers(file_path, engine=engine)
+        if not stats.count:
+            return {'error': "В файле не найдено корректных целых чисел"}
+        return summarize_stats(stats)
+    except UnicodeDecodeError:
+        return {'error': "Ошибка кодировки файла. Попробуйте файл в кодировке UTF-8"}
+    except Exception as e:
+        return {'error': f"Ошибка при анализе файла: {str(e)}"}
+
+
+def expand_paths(patterns):
+    """Раскрытие шаблонов glob с сохранением порядка и без повторов"""
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path not in seen and not os.path.isdir(path):
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def load_cache(cache_path):
+    """Чтение кэша результатов (пустой словарь, если кэша нет или он поврежден)"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache_path, cache):
+    """Атомарная запись кэша результатов"""
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(cache, file, ensure_ascii=False)
+    os.replace(temp_path, cache_path)
+
+
+def store_results(results, rows, cache):
+    """Сохранение результатов анализа в сводке и в кэше (ошибки не кэшируются)"""
+    for key, result in results:
+        rows[key['path']] = dict(key, **result)
+        if 'error' not in result:
+            cache[key['path']] = {'size': key['size'], 'mtime_ns': key['mtime_ns'], 'result': result}
+
+
+def analyze_batch(paths, jobs=None, engine=ENGINE_PYTHON, cache=None, use_sidecar=False):
+    """Анализ набора файлов в пуле процессов
+
+    Файлы, у которых размер и время изменения совпадают с записью в cache,
+    не разбираются повторно. Возвращает список строк сводки в порядке paths
+    и число результатов, взятых из кэша.
+    """
+    cache = {} if cache is None else cache
+    rows = {}
+    pending = []
+    cached_count = 0
+    for path in paths:
+        try:
+            info = os.stat(path)
+        except OSError as e:
+            rows[path] = {'path': path, 'error': f"Ошибка при открытии файла: {str(e)}"}
+            continue
+
+        key = {'path': path, 'size': info.st_size, 'mtime_ns': info.st_mtime_ns}
+        cached = cache.get(path)
+        if cached and cached['size'] == info.st_size and cached['mtime_ns'] == info.st_mtime_ns:
+            rows[path] = dict(key, **cached['result'])
+            cached_count += 1
+        else:
+            pending.append(key)
+
+    if (jobs or 1) == 1 or len(pending) < 2:
+        results = ((key, analyze_file_summary(key['path'], engine, use_sidecar)) for key in pending)
+        store_results(results, rows, cache)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(analyze_file_summary, key['path'], engine, use_sidecar): key
+                for key in pending
+            }
+            results = ((futures[future], future.result()) for future in as_completed(futures))
+            store_results(results, rows, cache)
+
+    return [rows[path] for path in paths], cached_count
+
+
+def write_summary(rows, file, output_format):
+    """Запись сводки в формате CSV или JSON"""
+    if output_format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, file, ensure_ascii=False, indent=2)
+        file.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Пакетный анализ целых чисел в текстовых файлах без графического интерфейса"
+    )
+    parser.add_argument('files', nargs='+', help="файлы или шаблоны glob (например, 'data/**/*.txt')")
+    parser.add_argument('-o', '--output', help="файл сводки .csv или .json (по умолчанию - стандартный вывод)")
+    parser.add_argument('--format', choices=('csv', 'json'), help="формат сводки (по умолчанию - по расширению)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument('--engine', choices=ENGINES,
+                        default=ENGINE_NUMPY if NUMPY_AVAILABLE else ENGINE_PYTHON,
+                        help="способ разбора файлов")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_FILE, help="файл кэша результатов")
+    parser.add_argument('--no-cache', action='store_true', help="не использовать кэш результатов")
+    parser.add_argument('--sidecar', action='store_true',
+                        help=f"хранить разобранные числа в файлах {SIDECAR_SUFFIX} рядом с исходными")
+    args = parser.parse_args(argv)
+
+    try:
+        check_engine(args.engine)
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    output_format = args.format
+    if output_format is None:
+        output_format = 'csv' if args.output and args.output.lower().endswith('.csv') else 'json'
+
+    paths = expand_paths(args.files)
+    cache = {} if args.no_cache else load_cache(args.cache)
+    rows, cached_count = analyze_batch(paths, args.jobs, args.engine, cache, args.sidecar)
+    if not args.no_cache:
+        save_cache(args.cache, cache)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as file:
+            write_summary(rows, file, output_format)
+    else:
+        write_summary(rows, sys.stdout, output_format)
+
+    errors = sum('error' in row for row in rows)
+    print(f"Обработано файлов: {len(rows)}, из кэша: {cached_count}, с ошибками: {errors}",
+          file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Планировщик отрисовки кадров в фоновом потоке
+
+Серия запросов (перетаскивание края окна, движение ползунка) схлопывается
+в одну отрисовку за кадр. Запрос, который устарел до начала работы, не
+выполняется, а результат работы, устаревшей во время выполнения,
+отбрасывается. Задача выполняется вне потока интерфейса, поэтому она
+должна работать с QImage, а не с QPixmap и виджетами.
+"""
+
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+
+
+# За это время запросы схлопываются в одну отрисовку (мс)
+FRAME_INTERVAL_MS = 16
+
+
+class RenderWorker(QThread):
+    """Выполнение одной задачи отрисовки в отдельном потоке"""
+    renderFinished = pyqtSignal(object, object)
+    renderFailed = pyqtSignal(object, object)
+
+    def __init__(self, key, job, parent=None):
+        super().__init__(parent)
+        self.key = key
+        self.job = job
+
+    def run(self):
+        try:
+            result = self.job()
+        except Exception as error:
+            self.renderFailed.emit(self.key, error)
+        else:
+            self.renderFinished.emit(self.key, result)
+
+
+class RenderScheduler(QObject):
+    """Очередь из одной задачи отрисовки: новая задача заменяет ждущую
+
+    request(ключ, задача) - задача без аргументов, возвращающая результат;
+    frameReady(ключ, результат) приходит только для последнего запроса.
+    """
+    frameReady = pyqtSignal(object, object)
+    renderFailed = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pending = None
+        self.latest_key = None
+        self.worker = None
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(FRAME_INTERVAL_MS)
+        self.timer.timeout.connect(self.dispatch)
+
+    def request(self, key, job):
+        """Запрос кадра; отрисовка начнется не раньше следующего кадра"""
+        self.latest_key = key
+        if self.worker is not None and self.worker.key == key:
+            # Этот кадр уже рисуется
+            self.pending = None
+            return
+        self.pending = (key, job)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def cancel(self):
+        """Отмена ждущей задачи; результат выполняемой будет отброшен"""
+        self.pending = None
+        self.latest_key = None
+
+    def dispatch(self):
+        if self.pending is None or self.worker is not None:
+            # Пока поток занят, ждущая задача запустится после него
+            return
+        key, job = self.pending
+        self.pending = None
+
+        self.worker = RenderWorker(key, job, self)
+        self.worker.renderFinished.connect(self.render_finished)
+        self.worker.renderFailed.connect(self.render_failed)
+        self.worker.finished.connect(self.worker_stopped)
+        self.worker.start()
+
+    def render_finished(self, key, result):
+        if key == self.latest_key:
+            self.frameReady.emit(key, result)
+
+    def render_failed(self, key, error):
+        if key == self.latest_key:
+            self.renderFailed.emit(error)
+
+    def worker_stopped(self):
+        self.worker.deleteLater()
+        self.worker = None
+        if self.pending is not None and not self.timer.isActive():
+            self.timer.start()
+
+    def shutdown(self):
+        """Остановка перед закрытием окна: ожидание выполняемой задачи"""
+        self.cancel()
+        self.timer.stop()
+        if self.worker is not None:
+            self.worker.wait()
@@ -0,0 +1,128 @@
+"""Проверки number_analysis: одинаковые результаты обоих способов разбора, двоичный кэш"""
+
+import random
+
+import pytest
+
+from number_analysis import (
+    ENGINE_NUMPY, ENGINE_PYTHON, NUMPY_AVAILABLE, SIDECAR_MAGIC, NumberStats, SidecarWriter,
+    analyze_numbers, read_sidecar_header,
+)
+
+needs_numpy = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy не установлен")
+
+
+CONTENTS = {
+    'simple': b'1 2 3\n-4\t+5\r\n600 0 -0\n',
+    'signs': b'+1 -1 +0 -0 +-1 -+1 --2 ++3 1- 2+ - + +7 -8\n',
+    'junk': b'12 abc 3.5 1e3 0x10 -7 x9 9x 1_000 \xd0\xb0\xd0\xb1 42 \xc2\xa0 13\n',
+    'long': (b'123456789012345678 -123456789012345678 9223372036854775807 '
+             b'-9223372036854775808 9223372036854775808 -99999999999999999999 '
+             b'1234567890123456789012345678901234567890 00000000000000000000001 5\n'),
+    'no_trailing_space': b'10 20 30 -40',
+    'separators': b'1\x0b2\x0c3\x1c4\x1d5\x1e6\x1f7   \n\n\n8',
+    'empty': b'',
+    'only_junk': b'abc def\n',
+}
+
+# Маленькие блоки разрезают числа на границах блоков
+CHUNK_SIZES = (1, 2, 3, 5, 7, 64, 1024 * 1024)
+
+
+def analyze(path, engine, chunk_size):
+    """Статистика и все разобранные числа по порядку"""
+    numbers = []
+    stats = analyze_numbers(str(path), chunk_size=chunk_size, engine=engine,
+                            values_sink=lambda values: numbers.extend(int(value) for value in values))
+    return stats, numbers
+
+
+@needs_numpy
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('name', sorted(CONTENTS))
+def test_engines_identical(tmp_path, name, chunk_size):
+    path = tmp_path / f'{name}.txt'
+    path.write_bytes(CONTENTS[name])
+
+    python_stats, python_numbers = analyze(path, ENGINE_PYTHON, chunk_size)
+    numpy_stats, numpy_numbers = analyze(path, ENGINE_NUMPY, chunk_size)
+
+    assert numpy_numbers == python_numbers
+    assert numpy_stats.count == python_stats.count
+    assert numpy_stats.total == python_stats.total
+    assert numpy_stats.sum_squares == python_stats.sum_squares
+    assert numpy_stats.min_value == python_stats.min_value
+    assert numpy_stats.max_value == python_stats.max_value
+    assert numpy_stats.avg_value == python_stats.avg_value
+    assert numpy_stats.std_value == python_stats.std_value
+
+
+@needs_numpy
+def test_expected_numbers(tmp_path):
+    """Знаки, мусор и длинные числа разбираются как int() в исходной программе"""
+    path = tmp_path / 'mixed.txt'
+    path.write_bytes(CONTENTS['signs'] + CONTENTS['junk'] + CONTENTS['long'])
+
+    expected = []
+    for token in path.read_bytes().decode('utf-8').split():
+        try:
+            expected.append(int(token))
+        except ValueError:
+            pass
+
+    for engine in (ENGINE_PYTHON, ENGINE_NUMPY):
+        for chunk_size in CHUNK_SIZES:
+            stats, numbers = analyze(path, engine, chunk_size)
+            assert numbers == expected
+            assert stats.count == len(expected)
+            assert stats.total == sum(expected)
+            assert stats.min_value == min(expected)
+            assert stats.max_value == max(expected)
+
+
+@needs_numpy
+def test_large_random_input(tmp_path):
+    """Блоки с одними числами идут по быстрому пути NumPy"""
+    rng = random.Random(3)
+    numbers = [rng.randint(-10 ** 12, 10 ** 12) for _ in range(20000)]
+    path = tmp_path / 'random.txt'
+    path.write_bytes('\n'.join(map(str, numbers)).encode('ascii'))
+
+    for chunk_size in (4096, 1024 * 1024):
+        python_stats, python_numbers = analyze(path, ENGINE_PYTHON, chunk_size)
+        numpy_stats, numpy_numbers = analyze(path, ENGINE_NUMPY, chunk_size)
+        assert python_numbers == numbers
+        assert numpy_numbers == numbers
+        assert numpy_stats.total == python_stats.total == sum(numbers)
+        assert numpy_stats.sum_squares == python_stats.sum_squares
+
+
+def test_sidecar_without_values_after_overflow(tmp_path):
+    """Число вне int64 отменяет запись чисел, и в кэше не остается дыры на их месте"""
+    path = str(tmp_path / 'numbers.txt.numcache')
+    stats = NumberStats()
+    writer = SidecarWriter(path)
+    for numbers in ([1, 2, 3] * 1000, [2 ** 70], [4, 5]):
+        stats.update(numbers)
+        writer.write(numbers)
+    writer.commit({'size': 0, 'mtime_ns': 0, 'hash': ''}, stats)
+
+    with open(path, 'rb') as sidecar:
+        data = sidecar.read()
+        header = read_sidecar_header(sidecar)
+    assert header['values_count'] is None
+    assert header['stats']['count'] == stats.count
+    header_length = int.from_bytes(data[-len(SIDECAR_MAGIC) - 8:-len(SIDECAR_MAGIC)], 'little')
+    assert len(data) == len(SIDECAR_MAGIC) * 2 + header_length + 8
+
+
+def test_digest_sample_keeps_weight():
+    """Выборка для t-digest сохраняет общий вес и примерное положение квантилей"""
+    rng = random.Random(5)
+    stats = NumberStats()
+    for _ in range(20):
+        stats.update([rng.randint(0, 999) for _ in range(10000)])
+
+    histogram = stats.histogram()
+    assert sum(count for _, _, count in histogram) == pytest.approx(stats.count, rel=0.01)
+    assert stats.median_value == pytest.approx(500, abs=25)
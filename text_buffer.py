@@ -0,0 +1,967 @@
+"""Работа с большими текстовыми файлами без загрузки их целиком в память"""
+
+import io
+import os
+import re
+import sys
+import glob
+import json
+import mmap
+import time
+import queue
+import codecs
+import random
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# Файлы от этого размера открываются в режиме просмотра большого файла
+LARGE_FILE_THRESHOLD = 32 * 1024 * 1024
+
+# Индекс хранит смещение начала каждой LINE_INDEX_STRIDE-й строки
+LINE_INDEX_STRIDE = 32
+LINE_BLOCK_RE = re.compile(rb'(?:[^\n]*\n){%d}' % LINE_INDEX_STRIDE)
+
+# Как часто (в блоках по LINE_INDEX_STRIDE строк) сообщается прогресс индексации
+INDEX_PROGRESS_BLOCKS = 4096
+
+# Сколько байтов в начале файла проверяется при выборе кодировки
+ENCODING_SAMPLE_SIZE = 1024 * 1024
+
+# Кодировка по умолчанию и запасная для файлов, которые не декодируются как UTF-8
+DEFAULT_ENCODING = 'utf-8'
+FALLBACK_ENCODING = 'cp1251'
+
+ENCODING_NAMES = {
+    'utf-8': "UTF-8",
+    'utf-8-sig': "UTF-8 с BOM",
+    'cp1251': "Windows-1251",
+}
+
+# Более длинные строки при показе обрезаются
+MAX_LINE_BYTES = 64 * 1024
+
+# Размер блока при чтении и записи файла (прогресс сообщается после каждого)
+IO_CHUNK_SIZE = 1024 * 1024
+
+# Маска прав процесса: читается один раз, пока не запущены фоновые потоки
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+# Журналы несохраненных правок для восстановления после сбоя
+RECOVERY_DIR = os.path.join(os.path.expanduser('~'), '.text_editor_recovery')
+JOURNAL_SUFFIX = '.journal'
+JOURNAL_FORMAT = 'text-journal-1'
+
+# Единицы позиций в журнале: символы QTextDocument или байты таблицы кусков
+UNITS_CHARS = 'chars'
+UNITS_BYTES = 'bytes'
+
+
+class IndexCancelled(Exception):
+    """Построение индекса строк было отменено"""
+
+
+def guess_encoding(sample):
+    """Кодировка по началу файла: UTF-8 (с BOM или без), иначе Windows-1251"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    decoder = codecs.getincrementaldecoder(DEFAULT_ENCODING)()
+    try:
+        # final=False: обрезанный на границе выборки символ не считается ошибкой
+        decoder.decode(sample, final=False)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+    return DEFAULT_ENCODING
+
+
+def text_decoder(encoding):
+    """Потоковый декодер, приводящий переводы строк к '\\n' (как текстовый режим)"""
+    return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+
+
+def read_text_file(file_path, progress=None):
+    """Чтение и декодирование файла за один проход: (текст, кодировка)
+
+    Кодировка выбирается по первому блоку. Если UTF-8 все же ломается дальше,
+    а прочитанное до этого было ASCII (одинаково в обеих кодировках),
+    декодирование просто продолжается в Windows-1251; иначе файл
+    перечитывается в ней с начала.
+    """
+    total = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        chunk = file.read(max(IO_CHUNK_SIZE, ENCODING_SAMPLE_SIZE))
+        encoding = guess_encoding(chunk)
+        decoder = text_decoder(encoding)
+        parts = []
+        done = 0
+        ascii_so_far = True
+
+        while chunk:
+            try:
+                parts.append(decoder.decode(chunk))
+            except UnicodeDecodeError:
+                # В Windows-1251 тоже есть неопределенные байты (0x98):
+                # повторять не с чем, иначе чтение зациклится
+                if encoding == FALLBACK_ENCODING:
+                    raise
+                pending_state = decoder.getstate()
+                encoding = FALLBACK_ENCODING
+                decoder = text_decoder(encoding)
+                if ascii_so_far:
+                    # Сохраняется только ожидающий '\r' с конца прошлого блока
+                    decoder.setstate((b'', pending_state[1]))
+                else:
+                    parts = []
+                    done = 0
+                    file.seek(0)
+                    chunk = file.read(IO_CHUNK_SIZE)
+                continue
+            ascii_so_far = ascii_so_far and chunk.isascii()
+            done += len(chunk)
+            if progress is not None:
+                progress(done, max(total, done))
+            chunk = file.read(IO_CHUNK_SIZE)
+
+        try:
+            parts.append(decoder.decode(b'', final=True))
+        except UnicodeDecodeError:
+            # Файл оборвался посреди многобайтового символа UTF-8
+            if encoding == FALLBACK_ENCODING:
+                raise
+            return read_text_as(file_path, FALLBACK_ENCODING), FALLBACK_ENCODING
+
+    return ''.join(parts), encoding
+
+
+def read_text_as(file_path, encoding):
+    with open(file_path, 'r', encoding=encoding) as file:
+        return file.read()
+
+
+def encode_text(text, encoding):
+    """Текст в байтах для записи: (данные, кодировка)
+
+    Символы, которых нет в исходной кодировке, не должны мешать сохранению:
+    тогда файл записывается в UTF-8.
+    """
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    try:
+        return text.encode(encoding), encoding
+    except UnicodeEncodeError:
+        return text.encode(DEFAULT_ENCODING), DEFAULT_ENCODING
+
+
+def iter_bytes_chunks(data):
+    view = memoryview(data)
+    for start in range(0, len(view), IO_CHUNK_SIZE):
+        yield view[start:start + IO_CHUNK_SIZE]
+
+
+def atomic_write(file_path, chunks, total, progress=None):
+    """Запись блоков во временный файл рядом с целевым, fsync и замена
+
+    При сбое во время записи целевой файл остается прежним.
+    """
+    temp_path = write_temp(file_path, chunks, total, progress)
+    try:
+        replace_with_temp(temp_path, file_path)
+    except BaseException:
+        remove_temp(temp_path)
+        raise
+
+
+def write_temp(file_path, chunks, total, progress=None):
+    """Запись блоков во временный файл рядом с file_path (с fsync); путь к нему
+
+    Права временного файла - как у file_path. Заменить им file_path можно
+    потом, через replace_with_temp: например, когда file_path отображен в
+    память, а в Windows отображенный файл заменить нельзя.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    handle, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(file_path) + '.',
+                                         suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            done = 0
+            for chunk in chunks:
+                file.write(chunk)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, max(total, done))
+            file.flush()
+            os.fsync(file.fileno())
+
+        # mkstemp создает файл с правами 0600: сохраняются права исходного файла
+        if os.path.exists(file_path):
+            os.chmod(temp_path, os.stat(file_path).st_mode & 0o7777)
+        else:
+            os.chmod(temp_path, 0o666 & ~UMASK)
+    except BaseException:
+        remove_temp(temp_path)
+        raise
+    return temp_path
+
+
+def remove_temp(temp_path):
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+def replace_with_temp(temp_path, file_path):
+    """Замена file_path временным файлом из write_temp (при ошибке он остается)"""
+    os.replace(temp_path, file_path)
+
+    # Переименование тоже должно попасть на диск
+    directory = os.path.dirname(os.path.abspath(file_path))
+    if hasattr(os, 'O_DIRECTORY'):
+        try:
+            directory_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            return
+        try:
+            os.fsync(directory_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_fd)
+
+
+class LineIndex:
+    """Разреженный индекс начал строк в отображенном в память файле
+
+    Запоминается только каждая LINE_INDEX_STRIDE-я строка, поэтому индекс
+    занимает в LINE_INDEX_STRIDE раз меньше памяти, а поиск любой строки
+    стоит не больше LINE_INDEX_STRIDE поисков перевода строки.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.size = len(buffer)
+        self.checkpoints = array('q', [0])
+        self.complete = False
+        # Сколько строк гарантированно доступно (растет во время построения)
+        self.line_count = 1
+
+    def build(self, progress=None):
+        """Построение индекса; progress(байт_обработано) может прервать его исключением"""
+        buffer = self.buffer
+        checkpoints = self.checkpoints
+        position = checkpoints[-1]
+        blocks = 0
+
+        while True:
+            # match вместо finditer: на хвосте без переводов строки поиск не
+            # повторяется с каждой следующей позиции
+            match = LINE_BLOCK_RE.match(buffer, position)
+            if match is None:
+                break
+            position = match.end()
+            checkpoints.append(position)
+            blocks += 1
+            if blocks % INDEX_PROGRESS_BLOCKS == 0:
+                self.line_count = (len(checkpoints) - 1) * LINE_INDEX_STRIDE + 1
+                if progress is not None:
+                    progress(position)
+
+        # Остаток после последней контрольной точки короче LINE_INDEX_STRIDE строк
+        tail_lines = 0
+        while True:
+            position = buffer.find(b'\n', position) + 1
+            if not position:
+                break
+            tail_lines += 1
+
+        self.line_count = (len(checkpoints) - 1) * LINE_INDEX_STRIDE + tail_lines + 1
+        self.complete = True
+        if progress is not None:
+            progress(self.size)
+
+    def newlines_before(self, position):
+        """Число переводов строки в buffer[:position] (индекс должен быть построен)"""
+        block = bisect_right(self.checkpoints, position) - 1
+        count = block * LINE_INDEX_STRIDE
+        start = self.checkpoints[block]
+        while True:
+            start = self.buffer.find(b'\n', start, position) + 1
+            if not start:
+                return count
+            count += 1
+
+    def line_start(self, line):
+        """Смещение начала строки с номером line (с нуля)"""
+        position = self.checkpoints[line // LINE_INDEX_STRIDE]
+        for _ in range(line % LINE_INDEX_STRIDE):
+            position = self.buffer.find(b'\n', position) + 1
+            if not position:
+                raise IndexError(f"строка {line + 1} за концом файла")
+        return position
+
+    def iter_lines(self, first, count):
+        """Байты строк first..first+count-1 без перевода строки"""
+        buffer = self.buffer
+        position = self.line_start(first)
+        for _ in range(min(count, self.line_count - first)):
+            end = buffer.find(b'\n', position)
+            next_position = end + 1
+            if end < 0:
+                end = next_position = self.size
+            data = buffer[position:min(end, position + MAX_LINE_BYTES)]
+            yield data[:-1] if data.endswith(b'\r') else data
+            position = next_position
+
+
+# Источники кусков таблицы: исходный файл и буфер добавленного текста
+SOURCE_ORIGINAL = 0
+SOURCE_ADDED = 1
+
+
+class Piece:
+    """Узел декартова дерева кусков; ключ - смещение в документе"""
+
+    __slots__ = ('source', 'start', 'length', 'newlines', 'priority', 'left', 'right',
+                 'total_length', 'total_newlines')
+
+    def __init__(self, source, start, length, newlines):
+        self.source = source
+        self.start = start
+        self.length = length
+        self.newlines = newlines
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.total_length = length
+        self.total_newlines = newlines
+
+    def update(self):
+        self.total_length = self.length
+        self.total_newlines = self.newlines
+        for child in (self.left, self.right):
+            if child is not None:
+                self.total_length += child.total_length
+                self.total_newlines += child.total_newlines
+
+
+def total_length(node):
+    return node.total_length if node is not None else 0
+
+
+def total_newlines(node):
+    return node.total_newlines if node is not None else 0
+
+
+def merge_trees(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = merge_trees(left.right, right)
+        left.update()
+        return left
+    right.left = merge_trees(left, right.left)
+    right.update()
+    return right
+
+
+class PieceTable:
+    """Документ из кусков исходного файла и буфера добавленного текста
+
+    Куски хранятся в декартовом дереве с суммами длин и переводов строк
+    в поддеревьях, поэтому вставка, удаление и поиск строки стоят O(log n)
+    от числа правок. Исходный файл не копируется: число переводов строки
+    в его кусках берется из LineIndex. Отмена хранит только описания кусков.
+    """
+
+    def __init__(self, original, index):
+        self.original = original
+        self.index = index
+        self.added = bytearray()
+        self.added_newlines = array('q')
+        self.root = None
+        if len(original):
+            self.root = Piece(SOURCE_ORIGINAL, 0, len(original), index.line_count - 1)
+        self.undo_stack = []
+        self.redo_stack = []
+        # listener(смещение, удалено_байтов, вставленные_байты) после каждой правки
+        self.listener = None
+
+    @property
+    def length(self):
+        return total_length(self.root)
+
+    @property
+    def line_count(self):
+        return total_newlines(self.root) + 1
+
+    # Переводы строк внутри источников
+
+    def count_newlines(self, source, start, end):
+        if source == SOURCE_ORIGINAL:
+            return self.index.newlines_before(end) - self.index.newlines_before(start)
+        return bisect_left(self.added_newlines, end) - bisect_left(self.added_newlines, start)
+
+    def nth_newline(self, source, start, number):
+        """Позиция number-го (с единицы) перевода строки источника после start"""
+        if source == SOURCE_ORIGINAL:
+            return self.index.line_start(self.index.newlines_before(start) + number) - 1
+        return self.added_newlines[bisect_left(self.added_newlines, start) + number - 1]
+
+    def source_bytes(self, source, start, end):
+        if source == SOURCE_ORIGINAL:
+            return self.original[start:end]
+        return bytes(self.added[start:end])
+
+    # Операции с деревом
+
+    def make_piece(self, source, start, length):
+        return Piece(source, start, length, self.count_newlines(source, start, start + length))
+
+    def split(self, node, offset):
+        """Деление дерева на первые offset байтов и остальное"""
+        if node is None:
+            return None, None
+        left_length = total_length(node.left)
+        if offset <= left_length:
+            left, right = self.split(node.left, offset)
+            node.left = right
+            node.update()
+            return left, node
+        if offset >= left_length + node.length:
+            left, right = self.split(node.right, offset - left_length - node.length)
+            node.right = left
+            node.update()
+            return node, right
+
+        # Разрез проходит внутри куска
+        cut = offset - left_length
+        tail = self.make_piece(node.source, node.start + cut, node.length - cut)
+        node.newlines -= tail.newlines
+        node.length = cut
+        right = merge_trees(tail, node.right)
+        node.right = None
+        node.update()
+        return node, right
+
+    def insert_pieces(self, offset, pieces):
+        middle = None
+        for source, start, length in pieces:
+            middle = merge_trees(middle, self.make_piece(source, start, length))
+        left, right = self.split(self.root, offset)
+        self.root = merge_trees(merge_trees(left, middle), right)
+        if self.listener is not None:
+            data = b''.join(self.source_bytes(source, start, start + length)
+                            for source, start, length in pieces)
+            self.listener(offset, 0, data)
+
+    def remove_pieces(self, offset, length):
+        """Удаление диапазона; возвращает описания удаленных кусков"""
+        left, rest = self.split(self.root, offset)
+        middle, right = self.split(rest, length)
+        self.root = merge_trees(left, right)
+        if self.listener is not None and middle is not None:
+            self.listener(offset, middle.total_length, b'')
+        return list(self.iter_pieces(middle))
+
+    def iter_pieces(self, node, offset=0):
+        """Куски (источник, начало, длина) поддерева по порядку, начиная со смещения offset"""
+        stack = []
+        while stack or node is not None:
+            if node is not None:
+                left_length = total_length(node.left)
+                if offset >= left_length + node.length:
+                    # Узел вместе с левым поддеревом целиком раньше offset
+                    offset -= left_length + node.length
+                    node = node.right
+                else:
+                    stack.append((node, offset - left_length))
+                    node = node.left if offset < left_length else None
+                continue
+            node, skip = stack.pop()
+            skip = max(skip, 0)
+            yield node.source, node.start + skip, node.length - skip
+            offset = 0
+            node = node.right
+
+    # Правка с отменой
+    #
+    # Шаг отмены - список операций (действие, смещение, куски) в порядке
+    # выполнения; отмена выполняет обратные операции в обратном порядке.
+
+    def append_added(self, data):
+        start = len(self.added)
+        for match in re.finditer(b'\n', data):
+            self.added_newlines.append(start + match.start())
+        self.added += data
+        return (SOURCE_ADDED, start, len(data))
+
+    def insert(self, offset, data):
+        if not data:
+            return
+        piece = self.append_added(data)
+        self.insert_pieces(offset, [piece])
+
+        # Набор подряд отменяется одним шагом
+        last = self.undo_stack[-1] if self.undo_stack else None
+        if last is not None and len(last) == 1 and last[0][0] == 'insert':
+            _, last_offset, pieces = last[0]
+            source, first, length = pieces[-1]
+            if (source == SOURCE_ADDED and first + length == piece[1]
+                    and last_offset + sum(item[2] for item in pieces) == offset):
+                pieces[-1] = (source, first, length + len(data))
+                self.redo_stack.clear()
+                return
+        self.push_undo([('insert', offset, [piece])])
+
+    def delete(self, offset, length):
+        if length <= 0:
+            return
+        self.push_undo([('delete', offset, self.remove_pieces(offset, length))])
+
+    def replace_ranges(self, ranges):
+        """Замена непересекающихся диапазонов [(смещение, длина, байты)] одним шагом отмены"""
+        operations = []
+        # С конца, чтобы смещения еще не обработанных диапазонов не сдвигались
+        for offset, length, data in sorted(ranges, reverse=True):
+            if length:
+                operations.append(('delete', offset, self.remove_pieces(offset, length)))
+            if data:
+                piece = self.append_added(data)
+                self.insert_pieces(offset, [piece])
+                operations.append(('insert', offset, [piece]))
+        if operations:
+            self.push_undo(operations)
+
+    def push_undo(self, operations):
+        self.undo_stack.append(operations)
+        self.redo_stack.clear()
+
+    def apply(self, action, offset, pieces):
+        if action == 'insert':
+            self.insert_pieces(offset, pieces)
+            return offset + sum(piece[2] for piece in pieces)
+        self.remove_pieces(offset, sum(piece[2] for piece in pieces))
+        return offset
+
+    def undo(self):
+        """Отмена последней правки; возвращает смещение курсора или None"""
+        if not self.undo_stack:
+            return None
+        operations = self.undo_stack.pop()
+        self.redo_stack.append(operations)
+        for action, offset, pieces in reversed(operations):
+            position = self.apply('delete' if action == 'insert' else 'insert', offset, pieces)
+        return position
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        operations = self.redo_stack.pop()
+        self.undo_stack.append(operations)
+        for action, offset, pieces in operations:
+            position = self.apply(action, offset, pieces)
+        return position
+
+    # Чтение
+
+    def read(self, offset, length):
+        parts = []
+        for source, start, piece_length in self.iter_pieces(self.root, offset):
+            if length <= 0:
+                break
+            take = min(piece_length, length)
+            parts.append(self.source_bytes(source, start, start + take))
+            length -= take
+        return b''.join(parts)
+
+    def newlines_before(self, offset):
+        """Номер строки, в которой находится смещение offset"""
+        count = 0
+        node = self.root
+        while node is not None:
+            left_length = total_length(node.left)
+            if offset < left_length:
+                node = node.left
+                continue
+            count += total_newlines(node.left)
+            offset -= left_length
+            if offset < node.length:
+                return count + self.count_newlines(node.source, node.start, node.start + offset)
+            count += node.newlines
+            offset -= node.length
+            node = node.right
+        return count
+
+    def line_start(self, line):
+        """Смещение начала строки line (с нуля) в документе"""
+        if line == 0:
+            return 0
+        node = self.root
+        base = 0
+        while node is not None:
+            left_newlines = total_newlines(node.left)
+            if line <= left_newlines:
+                node = node.left
+                continue
+            line -= left_newlines
+            base += total_length(node.left)
+            if line <= node.newlines:
+                return base + self.nth_newline(node.source, node.start, line) - node.start + 1
+            line -= node.newlines
+            base += node.length
+            node = node.right
+        raise IndexError("строка за концом документа")
+
+    def iter_chunks(self):
+        """Содержимое документа блоками для потоковой записи или поиска
+
+        Список кусков запоминается при вызове, а исходный файл и буфер
+        добавленного текста не меняются задним числом, поэтому генератор можно
+        отдать фоновому потоку, даже если документ продолжат править.
+        """
+        return self.iter_piece_chunks(list(self.iter_pieces(self.root)))
+
+    def iter_piece_chunks(self, pieces):
+        for source, start, length in pieces:
+            end = start + length
+            for position in range(start, end, IO_CHUNK_SIZE):
+                yield self.source_bytes(source, position, min(end, position + IO_CHUNK_SIZE))
+
+
+class MappedTextFile:
+    """Текстовый файл, отображенный в память, с индексом строк
+
+    Пока индекс строится, файл доступен только для чтения; после этого
+    enable_editing() создает таблицу кусков, и правки идут через нее.
+    Позиции в тексте задаются строкой и столбцом (в символах).
+    """
+
+    def __init__(self, file_path):
+        self.path = file_path
+        self.file = open(file_path, 'rb')
+        try:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.file.close()
+            raise
+        self.index = LineIndex(self.buffer)
+        self.encoding = guess_encoding(self.buffer[:ENCODING_SAMPLE_SIZE])
+        self.table = None
+
+        # BOM не входит в текст первой строки; вставки кодируются без него
+        self.bom_length = len(codecs.BOM_UTF8) if self.encoding == 'utf-8-sig' else 0
+        self.text_encoding = 'utf-8' if self.encoding == 'utf-8-sig' else self.encoding
+        first_line = next(self.index.iter_lines(0, 1), b'')
+        self.newline = b'\r\n' if self.buffer[len(first_line):len(first_line) + 2] == b'\r\n' \
+            else b'\n'
+
+    @property
+    def size(self):
+        return self.index.size
+
+    @property
+    def length(self):
+        return self.table.length if self.table is not None else self.index.size
+
+    @property
+    def line_count(self):
+        return self.table.line_count if self.table is not None else self.index.line_count
+
+    def enable_editing(self):
+        self.table = PieceTable(self.buffer, self.index)
+
+    def decode(self, data):
+        # surrogateescape: байты, которые не декодируются, переживают правку без изменений
+        return data.decode(self.text_encoding, errors='surrogateescape')
+
+    def encode(self, text):
+        return text.encode(self.text_encoding, errors='surrogateescape')
+
+    def line_bytes(self, line):
+        start = self.table.line_start(line)
+        if line + 1 < self.table.line_count:
+            end = self.table.line_start(line + 1) - 1
+        else:
+            end = self.table.length
+        data = self.table.read(start, min(end - start, MAX_LINE_BYTES))
+        return data[:-1] if data.endswith(b'\r') else data
+
+    def lines(self, first, count):
+        """Декодированные строки видимого окна"""
+        if self.table is None:
+            lines = [self.decode(data) for data in self.index.iter_lines(first, count)]
+        else:
+            last = min(first + count, self.table.line_count)
+            lines = [self.decode(self.line_bytes(line)) for line in range(first, last)]
+        if first == 0 and lines and self.bom_length:
+            lines[0] = lines[0][1:]
+        return lines
+
+    def line_text(self, line):
+        return self.lines(line, 1)[0]
+
+    def offset(self, line, column):
+        """Смещение в байтах для позиции (строка, столбец)"""
+        start = self.table.line_start(line) + (self.bom_length if line == 0 else 0)
+        return start + len(self.encode(self.line_text(line)[:column]))
+
+    def position(self, offset):
+        """Позиция (строка, столбец) для смещения в байтах"""
+        line = self.table.newlines_before(offset)
+        start = self.table.line_start(line) + (self.bom_length if line == 0 else 0)
+        return line, len(self.decode(self.table.read(start, max(0, offset - start))))
+
+    def insert_text(self, line, column, text):
+        """Вставка текста; возвращает позицию после него
+
+        UnicodeEncodeError, если символов нет в кодировке файла.
+        """
+        data = self.encode_inserted(text)
+        offset = self.offset(line, column)
+        self.table.insert(offset, data)
+        return self.position(offset + len(data))
+
+    def encode_inserted(self, text):
+        """Байты вставляемого текста с переводами строк как в файле"""
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text.replace('\n', self.newline.decode('ascii')).encode(self.text_encoding)
+
+    def newline_length_before(self, offset):
+        return 2 if offset >= 2 and self.table.read(offset - 2, 2) == b'\r\n' else 1
+
+    def delete_backward(self, line, column):
+        """Удаление символа перед позицией; возвращает новую позицию"""
+        if column > 0:
+            offset = self.offset(line, column)
+            size = len(self.encode(self.line_text(line)[column - 1]))
+            self.table.delete(offset - size, size)
+            return line, column - 1
+        if line > 0:
+            offset = self.table.line_start(line)
+            size = self.newline_length_before(offset)
+            self.table.delete(offset - size, size)
+            return self.position(offset - size)
+        return line, column
+
+    def delete_forward(self, line, column):
+        """Удаление символа после позиции"""
+        text = self.line_text(line)
+        if column < len(text):
+            size = len(self.encode(text[column]))
+            self.table.delete(self.offset(line, column), size)
+        elif line + 1 < self.table.line_count:
+            offset = self.table.line_start(line + 1)
+            size = self.newline_length_before(offset)
+            self.table.delete(offset - size, size)
+        return line, column
+
+    def replace_ranges(self, ranges):
+        """Замена [(смещение, длина, текст)] одним шагом отмены; позиция начала первой"""
+        encoded = [(offset, length, self.encode_inserted(text)) for offset, length, text in ranges]
+        self.table.replace_ranges(encoded)
+        return self.position(min(offset for offset, _, _ in ranges)) if ranges else None
+
+    def undo(self):
+        offset = self.table.undo()
+        return None if offset is None else self.position(offset)
+
+    def redo(self):
+        offset = self.table.redo()
+        return None if offset is None else self.position(offset)
+
+    def replay(self, entries):
+        """Повтор правок из журнала (позиции в байтах, текст в latin-1)"""
+        for position, removed, inserted in entries:
+            self.table.delete(position, removed)
+            self.table.insert(position, inserted.encode('latin-1'))
+
+    def iter_chunks(self):
+        if self.table is None:
+            return iter_bytes_chunks(self.buffer)
+        return self.table.iter_chunks()
+
+    def close(self):
+        self.table = None
+        self.buffer.close()
+        self.file.close()
+
+
+def process_alive(pid):
+    """Жив ли процесс (журнал работающего редактора не восстанавливается)"""
+    if sys.platform == 'win32':
+        import ctypes
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def file_identity(file_path):
+    """Размер и время изменения: по ним проверяется, что исходный файл не менялся"""
+    info = os.stat(file_path)
+    return info.st_size, info.st_mtime_ns
+
+
+def journal_header(file_path, units, encoding):
+    header = {
+        'format': JOURNAL_FORMAT,
+        'path': os.path.abspath(file_path) if file_path else None,
+        'units': units,
+        'encoding': encoding,
+        'pid': os.getpid(),
+        'created': time.time(),
+    }
+    if file_path:
+        header['size'], header['mtime_ns'] = file_identity(file_path)
+    return header
+
+
+def read_journal(journal_path):
+    """Заголовок и правки [позиция, удалено, вставлено] из журнала
+
+    Недописанная при сбое последняя строка пропускается.
+    """
+    with open(journal_path, 'r', encoding='utf-8') as file:
+        lines = file.read().split('\n')
+    header = json.loads(lines[0])
+    if header.get('format') != JOURNAL_FORMAT:
+        raise ValueError("неизвестный формат журнала")
+    entries = []
+    for line in lines[1:]:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            break
+    return header, entries
+
+
+def find_journals(directory=RECOVERY_DIR):
+    """Журналы завершившихся аварийно редакторов, новые первыми"""
+    journals = []
+    for journal_path in glob.glob(os.path.join(directory, '*' + JOURNAL_SUFFIX)):
+        try:
+            header, entries = read_journal(journal_path)
+        except (OSError, ValueError):
+            continue
+        if not process_alive(header.get('pid', 0)):
+            journals.append((journal_path, header, entries))
+    journals.sort(key=lambda journal: journal[1].get('created', 0), reverse=True)
+    return journals
+
+
+def journal_matches_file(header):
+    """Можно ли повторить журнал поверх файла на диске"""
+    if header['path'] is None:
+        return True
+    try:
+        return file_identity(header['path']) == (header['size'], header['mtime_ns'])
+    except OSError:
+        return False
+
+
+def remove_journal(journal_path):
+    try:
+        os.remove(journal_path)
+    except OSError:
+        pass
+
+
+class RecoveryJournal:
+    """Журнал правок для восстановления после сбоя
+
+    Правки копятся в памяти, а flush() по таймеру отдает их фоновому потоку,
+    который дописывает их в файл и делает fsync. Подряд идущие вставки
+    склеиваются в одну запись.
+    """
+
+    def __init__(self, directory=RECOVERY_DIR):
+        self.directory = directory
+        self.path = None
+        self.units = None
+        self.pending = []
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    @property
+    def active(self):
+        return self.path is not None
+
+    def begin(self, header):
+        """Новый журнал для документа (прошлый удаляется)"""
+        self.discard()
+        self.units = header['units']
+        self.path = os.path.join(self.directory,
+                                 f"{os.getpid()}-{time.time_ns()}{JOURNAL_SUFFIX}")
+        self.queue.put(('begin', self.path, json.dumps(header, ensure_ascii=False)))
+
+    def length(self, text):
+        """Длина текста в единицах позиций журнала"""
+        if self.units == UNITS_CHARS and not text.isascii():
+            # Позиции QTextDocument считаются в единицах UTF-16
+            return len(text.encode('utf-16-le', 'surrogatepass')) // 2
+        return len(text)
+
+    def record(self, position, removed, inserted):
+        if self.pending:
+            last = self.pending[-1]
+            if not removed and not last[1] and position == last[0] + self.length(last[2]):
+                last[2] += inserted
+                return
+        self.pending.append([position, removed, inserted])
+
+    def flush(self):
+        if self.path is not None and self.pending:
+            lines = ''.join(json.dumps(entry) + '\n' for entry in self.pending)
+            self.pending = []
+            self.queue.put(('append', self.path, lines))
+
+    def discard(self):
+        """Удаление журнала: правки сохранены или отброшены пользователем"""
+        self.pending = []
+        if self.path is not None:
+            self.queue.put(('remove', self.path, None))
+            self.path = None
+
+    def close(self):
+        """Остановка потока записи после всех поставленных команд"""
+        self.queue.put(None)
+        self.thread.join()
+
+    def write_loop(self):
+        while True:
+            command = self.queue.get()
+            if command is None:
+                return
+            action, journal_path, data = command
+            try:
+                if action == 'begin':
+                    os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+                    with open(journal_path, 'w', encoding='utf-8') as file:
+                        file.write(data + '\n')
+                        file.flush()
+                        os.fsync(file.fileno())
+                elif action == 'append':
+                    with open(journal_path, 'a', encoding='utf-8') as file:
+                        file.write(data)
+                        file.flush()
+                        os.fsync(file.fileno())
+                else:
+                    remove_journal(journal_path)
+            except OSError:
+                # Журнал - страховка: его ошибки не должны мешать правке
+                pass
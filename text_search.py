@@ -0,0 +1,232 @@
+"""Поиск и замена в тексте документа без GUI"""
+
+import re
+
+from lazy_import import lazy_import
+
+# numpy загружается при первом использовании, а не при запуске
+np = lazy_import('numpy')
+
+NUMPY_AVAILABLE = np is not None
+
+
+# Размер блока поиска (в символах или байтах). Блоки режутся по переводу
+# строки, поэтому совпадение не может пересекать границу блока
+SEARCH_BLOCK_SIZE = 1024 * 1024
+
+# Строка длиннее двух блоков режется принудительно. Соседние блоки тогда
+# перекрываются на столько символов (байтов): совпадение на разрезе не
+# длиннее перекрытия находится целиком, а ^, $ и просмотр назад и вперед
+# видят настоящих соседей, а не край блока
+SEARCH_OVERLAP = 64 * 1024
+
+# Сколько совпадений собирается перед отправкой в интерфейс
+MATCH_BATCH_SIZE = 1000
+
+# Триграммный индекс строится только для документов не больше этого размера
+TRIGRAM_INDEX_LIMIT = 64 * 1024 * 1024
+
+
+class SearchCancelled(Exception):
+    """Поиск был отменен"""
+
+
+def compile_query(query, regex=False, case_sensitive=True):
+    """Регулярное выражение для запроса (re.error, если оно неверно)
+
+    ^ и $ совпадают в начале и конце каждой строки: поиск идет блоками по
+    целым строкам, и без re.MULTILINE они срабатывали бы на границах блоков.
+    """
+    flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+    return re.compile(query if regex else re.escape(query), flags)
+
+
+def cut_at_newline(data, block_size, newline):
+    """Длина первого блока: не меньше block_size и до перевода строки включительно"""
+    if len(data) <= block_size:
+        return len(data)
+    end = data.find(newline, block_size)
+    return len(data) if end < 0 else end + 1
+
+
+def line_blocks(pieces, block_size, newline):
+    """Блоки (смещение, начало, блок, хвост) из последовательных кусков данных
+
+    Блок заканчивается первым переводом строки после block_size, но не
+    длиннее 2 * block_size: дальше строка режется принудительно, и тогда
+    хвост - следующие SEARCH_OVERLAP элементов, а начало следующего блока -
+    столько же предыдущих. У блоков, разрезанных по переводу строки, начало
+    и хвост пустые. В памяти держится не больше 2 * block_size + SEARCH_OVERLAP
+    элементов сверх одного куска.
+    """
+    empty = newline[:0]
+    limit = 2 * block_size
+    pieces = iter(pieces)
+    pending = empty
+    head = empty
+    offset = 0
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < limit + SEARCH_OVERLAP:
+            piece = next(pieces, None)
+            if piece is None:
+                exhausted = True
+            else:
+                pending += piece
+        if not pending:
+            return
+
+        size = cut_at_newline(pending[:limit], block_size, newline)
+        forced = size < len(pending) and pending[size - 1:size] != newline
+        if forced and isinstance(pending, bytes):
+            # Разрез не попадает внутрь многобайтного символа UTF-8
+            for _ in range(3):
+                if pending[size] & 0xC0 != 0x80 or size <= 1:
+                    break
+                size -= 1
+        tail = pending[size:size + SEARCH_OVERLAP] if forced else empty
+        yield offset, head, pending[:size], tail
+        head = pending[max(0, size - SEARCH_OVERLAP):size] if forced else empty
+        offset += size
+        pending = pending[size:]
+
+
+class TextSource:
+    """Документ в виде строки; позиции в единицах UTF-16, как в QTextDocument"""
+
+    def __init__(self, text):
+        self.text = text
+        self.size = len(text)
+
+    def units(self, text):
+        if text.isascii():
+            return len(text)
+        return len(text.encode('utf-16-le', 'surrogatepass')) // 2
+
+    def decode(self, raw):
+        return raw
+
+    def blocks(self, block_size=SEARCH_BLOCK_SIZE):
+        """Блоки (смещение, начало, данные, хвост) по порядку, см. line_blocks"""
+        text = self.text
+        pieces = (text[start:start + block_size] for start in range(0, len(text), block_size))
+        units = 0
+        for _, head, block, tail in line_blocks(pieces, block_size, '\n'):
+            yield units, head, block, tail
+            units += self.units(block)
+
+
+class BytesSource:
+    """Документ в виде потока байтовых блоков; позиции в байтах"""
+
+    def __init__(self, chunks, size, encoding):
+        self.chunks = chunks
+        self.size = size
+        self.encoding = encoding
+
+    def units(self, text):
+        if text.isascii():
+            return len(text)
+        return len(text.encode(self.encoding, 'surrogateescape'))
+
+    def decode(self, raw):
+        # surrogateescape: смещения совпадений считаются по тем же байтам
+        return raw.decode(self.encoding, 'surrogateescape')
+
+    def blocks(self, block_size=SEARCH_BLOCK_SIZE):
+        """Блоки (смещение, начало, данные, хвост) по порядку, см. line_blocks"""
+        return line_blocks(self.chunks, block_size, b'\n')
+
+
+def trigram_codes(text):
+    """Отсортированные уникальные коды триграмм строки (по 21 бит на символ)"""
+    codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype='<u4').astype(np.uint64)
+    if len(codes) < 3:
+        return np.empty(0, dtype=np.uint64)
+    return np.unique((codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:])
+
+
+class TrigramIndex:
+    """Триграммы каждого блока документа в нижнем регистре
+
+    Блок может содержать совпадение, только если в нем есть все триграммы
+    запроса, поэтому повторный поиск по тому же документу просматривает
+    лишь такие блоки.
+    """
+
+    def __init__(self):
+        self.blocks = []
+
+    def add_block(self, text):
+        self.blocks.append(trigram_codes(text.lower()))
+
+    def candidates(self, query):
+        """Номера блоков, где может быть запрос, или None, если индекс не поможет"""
+        codes = trigram_codes(query.lower())
+        if len(codes) == 0:
+            return None
+        result = set()
+        for number, block in enumerate(self.blocks):
+            if len(block) == 0:
+                continue
+            found = np.minimum(np.searchsorted(block, codes), len(block) - 1)
+            if (block[found] == codes).all():
+                result.add(number)
+        return result
+
+
+def search_source(source, pattern, replacement=None, regex=False, candidates=None,
+                  index=None, progress=None):
+    """Поиск по блокам источника: генератор пачек совпадений
+
+    Совпадение - (смещение, длина) в единицах источника или, если задана
+    replacement, (смещение, длина, текст замены). candidates - номера блоков
+    для просмотра (остальные пропускаются), index - TrigramIndex, который
+    заполняется по пути. progress(смещение) вызывается после каждого блока
+    и может прервать поиск исключением.
+    """
+    batch = []
+    # На сколько символов последнее совпадение зашло в следующий блок
+    carry = 0
+    for number, (start, head, raw, tail) in enumerate(source.blocks()):
+        if candidates is not None and number not in candidates:
+            carry = 0
+            if progress is not None:
+                progress(start)
+            continue
+
+        # Блок ищется вместе с соседями по принудительному разрезу, но
+        # совпадения берутся только начинающиеся в самом блоке
+        before = source.decode(head)
+        text = before + source.decode(raw)
+        end = len(text)
+        text += source.decode(tail)
+        if index is not None:
+            index.add_block(text)
+
+        units = start
+        position = len(before)
+        resume = position + carry
+        for match in pattern.finditer(text, min(resume, end)):
+            if match.start() >= end:
+                break
+            if match.start() == match.end():
+                # Пустые совпадения (например, 'x*') не выделяются
+                continue
+            units += source.units(text[position:match.start()])
+            length = source.units(match.group())
+            if replacement is None:
+                batch.append((units, length))
+            else:
+                batch.append((units, length, match.expand(replacement) if regex else replacement))
+            units += length
+            position = resume = match.end()
+            if len(batch) >= MATCH_BATCH_SIZE:
+                yield batch
+                batch = []
+        carry = max(0, resume - end)
+
+        if progress is not None:
+            progress(start + len(raw))
+    if batch:
+        yield batch
@@ -0,0 +1,142 @@
+"""Загрузка интерфейса из .ui-файлов через заранее скомпилированные модули
+
+uic.loadUi при каждом запуске разбирает XML и строит интерфейс по нему.
+Сборка один раз компилирует каждый .ui в модуль Python в каталоге
+__uicache__ рядом с ним; повторно компилируются только изменившиеся файлы:
+
+    python ui_loader.py            # все .ui в каталоге программы
+    python ui_loader.py piano.ui   # отдельные файлы
+
+Модуль помнит хэш .ui, из которого собран. Если модуля нет или .ui с тех
+пор изменился, интерфейс загружается через uic, как раньше.
+"""
+
+import sys
+import os
+import glob
+import hashlib
+import tempfile
+import importlib.util
+
+
+# Каталог со скомпилированными модулями (рядом с .ui-файлами)
+UI_CACHE_DIR = '__uicache__'
+
+# Первая строка модуля: хэш содержимого .ui, из которого он собран
+SOURCE_HASH_PREFIX = '# ui-source-sha1: '
+
+# False - всегда загружать через uic (для замеров и отладки)
+USE_CACHE = True
+
+
+def source_hash(ui_file):
+    with open(ui_file, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def cache_path(ui_file):
+    """Путь к скомпилированному модулю для .ui-файла"""
+    directory, name = os.path.split(os.path.abspath(ui_file))
+    return os.path.join(directory, UI_CACHE_DIR, f"ui_{os.path.splitext(name)[0]}.py")
+
+
+def cached_hash(module_path):
+    """Хэш .ui, записанный в модуле (None, если модуля нет)"""
+    try:
+        with open(module_path, 'r', encoding='utf-8') as file:
+            line = file.readline()
+    except OSError:
+        return None
+    if not line.startswith(SOURCE_HASH_PREFIX):
+        return None
+    return line[len(SOURCE_HASH_PREFIX):].strip()
+
+
+def is_fresh(ui_file):
+    """Есть ли модуль, собранный из текущего содержимого .ui"""
+    return cached_hash(cache_path(ui_file)) == source_hash(ui_file)
+
+
+def compile_ui(ui_file):
+    """Компиляция .ui в модуль кэша (атомарная замена старого модуля)"""
+    from PyQt5 import uic
+
+    module_path = cache_path(ui_file)
+    directory = os.path.dirname(module_path)
+    os.makedirs(directory, exist_ok=True)
+
+    digest = source_hash(ui_file)
+    descriptor, temp_path = tempfile.mkstemp(prefix='.ui-', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            file.write(f"{SOURCE_HASH_PREFIX}{digest}\n")
+            uic.compileUi(ui_file, file)
+        os.replace(temp_path, module_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return module_path
+
+
+def load_compiled(ui_file, window):
+    """Построение интерфейса скомпилированным модулем; False, если его нельзя использовать"""
+    module_path = cache_path(ui_file)
+    if cached_hash(module_path) != source_hash(ui_file):
+        return False
+
+    name = f"{UI_CACHE_DIR}.{os.path.splitext(os.path.basename(module_path))[0]}"
+    module = sys.modules.get(name)
+    if module is None or getattr(module, '__file__', None) != module_path:
+        spec = importlib.util.spec_from_file_location(name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+
+    classes = [value for key, value in vars(module).items() if key.startswith('Ui_')]
+    if len(classes) != 1:
+        return False
+
+    form = classes[0]()
+    form.setupUi(window)
+    # uic.loadUi делает виджеты атрибутами окна - здесь то же самое
+    for key, value in vars(form).items():
+        setattr(window, key, value)
+    return True
+
+
+def load_ui(ui_file, window):
+    """Загрузка интерфейса из .ui в окно: из кэша, а если его нет - через uic"""
+    if USE_CACHE:
+        try:
+            if load_compiled(ui_file, window):
+                return
+        except (OSError, ImportError, SyntaxError):
+            pass
+
+    from PyQt5 import uic
+    uic.loadUi(ui_file, window)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    ui_files = argv or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.ui')))
+
+    failed = False
+    for ui_file in ui_files:
+        try:
+            if is_fresh(ui_file):
+                print(f"{ui_file}: актуален")
+                continue
+            print(f"{ui_file}: собран в {compile_ui(ui_file)}")
+        except Exception as error:
+            print(f"{ui_file}: ошибка сборки: {error}", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())